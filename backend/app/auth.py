@@ -1,12 +1,13 @@
 import jwt
 from datetime import datetime, timedelta
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from app.database import SessionLocal
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 import os
 
 from app.models import User
+from app.utils.password_hashing import PasswordHashPool
+from app.utils.token_cache import VerifiedTokenCache
 
 load_dotenv()
 
@@ -15,16 +16,10 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Password hashing for request handlers, off the event loop
+password_hasher = PasswordHashPool()
+# Tokens whose signature was already verified
+token_cache = VerifiedTokenCache()
 
 
 def create_refresh_token(data: dict, expires_delta: timedelta = timedelta(days=7)):
@@ -43,8 +38,12 @@ def create_access_token(data: dict):
 
 
 def decode_token(token: str):
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.put(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
@@ -52,6 +51,20 @@ def decode_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+def get_current_username(request: Request) -> str:
+    """Username of the caller, from the access_token cookie or a Bearer header."""
+    token = request.cookies.get("access_token")
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    if not token:
+        raise HTTPException(status_code=401, detail="Access token not provided")
+    username = decode_token(token).get("sub")
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+    return username
+
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
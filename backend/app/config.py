@@ -0,0 +1,66 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# WebSocket heartbeat (seconds)
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", "60"))
+# Close sockets that sent no action (pongs excluded) for this long, 0 disables
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "0"))
+
+# Presence diffs are coalesced and flushed once per tick (seconds)
+PRESENCE_TICK = float(os.getenv("PRESENCE_TICK", "1"))
+
+# Opt-in outbound frame coalescing, negotiated with "coalesce" in the connect frame
+WS_COALESCE_WINDOW_MS = float(os.getenv("WS_COALESCE_WINDOW_MS", "5"))
+WS_COALESCE_MAX_MESSAGES = int(os.getenv("WS_COALESCE_MAX_MESSAGES", "32"))
+# Upper bounds a client may ask for
+WS_COALESCE_MAX_WINDOW_MS = float(os.getenv("WS_COALESCE_MAX_WINDOW_MS", "50"))
+WS_COALESCE_MAX_BATCH = int(os.getenv("WS_COALESCE_MAX_BATCH", "256"))
+
+# Rows deleted per transaction when purging a deleted group
+GROUP_PURGE_CHUNK = int(os.getenv("GROUP_PURGE_CHUNK", "1000"))
+
+# Message retention: messages older than this are moved to the archive, 0 disables
+MESSAGE_RETENTION_DAYS = float(os.getenv("MESSAGE_RETENTION_DAYS", "0"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))
+# Messages archived per transaction
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+
+# Full-text search ranks the matches in windows of this many, newest window first
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "500"))
+
+# Characters of the last message kept in the inbox preview
+INBOX_PREVIEW_LENGTH = int(os.getenv("INBOX_PREVIEW_LENGTH", "100"))
+
+# Attachments
+ATTACHMENTS_DIR = os.getenv("ATTACHMENTS_DIR", "./attachments")
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
+ATTACHMENT_CHUNK_BYTES = int(os.getenv("ATTACHMENT_CHUNK_BYTES", str(256 * 1024)))
+
+# Opt-in capture of inbound /ws frames (gzipped JSON lines) for benchmarks/replay_traffic.py
+WS_RECORD_PATH = os.getenv("WS_RECORD_PATH", "")
+
+# Admission control, 0 disables a limit
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "0"))
+MAX_CONNECTIONS_PER_USER = int(os.getenv("MAX_CONNECTIONS_PER_USER", "0"))
+MAX_ROOMS_PER_CONNECTION = int(os.getenv("MAX_ROOMS_PER_CONNECTION", "0"))
+MAX_PENDING_OUTBOUND_BYTES = int(os.getenv("MAX_PENDING_OUTBOUND_BYTES", "0"))
+# Seconds an accepted /ws socket may take to send its authentication frame
+WS_AUTH_TIMEOUT = float(os.getenv("WS_AUTH_TIMEOUT", "10"))
+# Estimated memory of one connection outside the registry (ASGI protocol, buffers, DB session),
+# about 140 KiB of RSS per idle connection measured under uvicorn with the websockets backend
+WS_CONNECTION_BASE_BYTES = int(os.getenv("WS_CONNECTION_BASE_BYTES", str(144 * 1024)))
+
+# Password hashing: bcrypt cost factor, worker processes and hashes allowed in flight before 503.
+# Every uvicorn worker starts its own pool, so with --workers N the default runs N * cpu_count
+# hashing processes; set PASSWORD_HASH_WORKERS to cpu_count / N when running several workers.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# Verified access/refresh tokens remembered until they expire, 0 disables
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
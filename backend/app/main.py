@@ -1,15 +1,33 @@
+import asyncio
 import json
 import secrets
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
-from starlette.websockets import WebSocketDisconnect
+from starlette.responses import JSONResponse, FileResponse
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+from app.config import WS_AUTH_TIMEOUT
 from app.utils.admin_actions import check_if_admin
-from app.models import GroupChat, User
-from app.websocket.handle_websocket_actions import handle_websocket_action, connection_manager
+from app.utils.attachments import blob_path, can_read_attachment
+from app.utils.group_purge import purge_group, purge_deleted_groups
+from app.utils.message_archive import RetentionWorker
+from app.utils.message_search import create_search_index, search_messages
+from app.utils.inbox import get_inbox
+from app.utils.read_state import get_unread_counts
+from app.models import Attachment, GroupChat, User
+from app.websocket.handle_websocket_actions import (
+    handle_websocket_action,
+    connection_manager,
+    heartbeat_reaper,
+    presence_manager,
+    attachment_uploads,
+    group_chat_manager,
+    traffic_recorder
+)
 
 from app.database import (
+    engine,
     get_db,
     create_all_tables
 )
@@ -17,21 +35,24 @@ from fastapi import (
     FastAPI,
     Depends,
     HTTPException,
+    BackgroundTasks,
     WebSocket,
     Response,
-    Request
+    Request,
+    Query
 )
 from app.schemas import (
     UserCreate,
     UserResponse,
-    LoginRequest, GroupChatResponse, GroupChatRequest
+    LoginRequest, GroupChatResponse, GroupChatRequest, GroupMembersRequest
 )
 from app.auth import (
     create_access_token,
     decode_token,
-    hash_password,
-    verify_password,
-    create_refresh_token
+    password_hasher,
+    token_cache,
+    create_refresh_token,
+    get_current_username
 )
 
 app = FastAPI()
@@ -44,33 +65,67 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+retention_worker = RetentionWorker()
+
 
 @app.on_event("startup")
 async def startup_event():
     create_all_tables()
+    create_search_index(engine)
+    asyncio.get_running_loop().run_in_executor(None, purge_deleted_groups)
+    heartbeat_reaper.start()
+    presence_manager.start()
+    retention_worker.start()
+    password_hasher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await heartbeat_reaper.stop()
+    await presence_manager.stop()
+    await retention_worker.stop()
+    traffic_recorder.shutdown()
+    password_hasher.stop()
 
 
 @app.post("/register/", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     if db.query(User).filter(User.username == user.username).first():
         raise HTTPException(status_code=400, detail="Username already exists")
     if db.query(User).filter(User.email == user.email).first():
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    hashed_password = hash_password(user.password)
+    # End the read transaction so no pooled DB connection is held while bcrypt runs
+    db.commit()
+    hashed_password = await password_hasher.hash(user.password)
     new_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Registered concurrently while bcrypt was running
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Username or email already exists")
     db.refresh(new_user)
     return new_user
 
 
 @app.post("/login/")
-def login(login_data: LoginRequest, response: Response, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, response: Response, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.username == login_data.username).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    hashed_password = user.hashed_password
+    # End the read transaction so no pooled DB connection is held while bcrypt runs
+    db.commit()
+    matches, new_hash = await password_hasher.verify(login_data.password, hashed_password)
+    if not matches:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored with an outdated BCRYPT_ROUNDS, upgrade while we know the password
+        user.hashed_password = new_hash
+        db.commit()
 
     access_token = create_access_token({"sub": login_data.username}).decode('utf-8')
     refresh_token = create_refresh_token({"sub": login_data.username}).decode('utf-8')
@@ -144,7 +199,7 @@ async def get_candidates(db: Session = Depends(get_db)):
 
 @app.get("/groups/")
 async def get_groups(db: Session = Depends(get_db)):
-    groups = db.query(GroupChat).all()
+    groups = db.query(GroupChat).filter(GroupChat.is_deleted.is_(False)).all()
     # Properly create a list of dictionaries
     group_list = [{"group_name": group.name} for group in groups]
     return JSONResponse(content=group_list)
@@ -183,7 +238,7 @@ async def get_group_members(db: Session = Depends(get_db)):
 @app.get("/group/{group_name}/members")
 async def get_group_members(group_name: str, db: Session = Depends(get_db)):
     """Fetch all users who are members of the given group."""
-    group = db.query(GroupChat).filter(GroupChat.name == group_name).first()
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
     if not group:
         return {"error": "Group not found"}
 
@@ -194,9 +249,47 @@ async def get_group_members(group_name: str, db: Session = Depends(get_db)):
     return {"group_name": group_name, "members": members}
 
 
+@app.post("/group/{group_name}/members")
+async def add_group_members(group_name: str,
+                            members: GroupMembersRequest,
+                            username: str = Depends(get_current_username),
+                            db: Session = Depends(get_db)):
+    """Add many users to a group in one transaction. The caller must be in the group."""
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
+    adder = db.query(User).filter(User.username == username).first()
+    if not group or not adder:
+        raise HTTPException(status_code=404, detail="Group or User not found")
+    if not any(user.id == adder.id for user in group.users) and adder.id != group.admin_id:
+        raise HTTPException(status_code=403, detail="You are not in the group")
+    try:
+        added = await group_chat_manager.add_users_to_group(group.id, members.user_ids, adder.id, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_name": group_name, "added": [{"id": user.id, "username": user.username} for user in added]}
+
+
+@app.delete("/group/{group_name}/members")
+async def remove_group_members(group_name: str,
+                               members: GroupMembersRequest,
+                               username: str = Depends(get_current_username),
+                               db: Session = Depends(get_db)):
+    """Remove many users from a group in one transaction. Admin only."""
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
+    admin = db.query(User).filter(User.username == username).first()
+    if not group or not admin:
+        raise HTTPException(status_code=404, detail="Group or Admin not found")
+    if not check_if_admin(admin.id, group.id, db):
+        raise HTTPException(status_code=403, detail="You are not an admin")
+    try:
+        removed = await group_chat_manager.remove_users_from_group(group.id, members.user_ids, admin.id, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_name": group_name, "removed": [{"id": user.id, "username": user.username} for user in removed]}
+
+
 @app.get("/{group_name}/check_admin/{admin_name}")
 async def check_admin(group_name: str, admin_name: str, db: Session = Depends(get_db)):
-    group = db.query(GroupChat).filter(GroupChat.name == group_name).first()
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
     admin = db.query(User).filter(User.username == admin_name).first()
     if check_if_admin(admin_id=admin.id, group_id=group.id, db=db):
         return {"admin": True}
@@ -205,8 +298,9 @@ async def check_admin(group_name: str, admin_name: str, db: Session = Depends(ge
 
 
 @app.delete("/group/{group_name}/delete/{admin_name}")
-async def delete_group(group_name: str, admin_name: str, db: Session = Depends(get_db)):
-    group = db.query(GroupChat).filter(GroupChat.name == group_name).first()
+async def delete_group(group_name: str, admin_name: str, background_tasks: BackgroundTasks,
+                       db: Session = Depends(get_db)):
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
     admin = db.query(User).filter(User.username == admin_name).first()
 
     if not group or not admin:
@@ -215,36 +309,142 @@ async def delete_group(group_name: str, admin_name: str, db: Session = Depends(g
     if not check_if_admin(admin.id, group.id, db):
         raise HTTPException(status_code=403, detail="You are not an admin")
 
-    db.delete(group)
+    # Hide the group right away, its rows are purged in chunks after the response
+    group.is_deleted = True
     db.commit()
+    await connection_manager.remove_chat(group.id, "group", {"type": "group_deleted", "group_name": group_name})
+    background_tasks.add_task(purge_group, group.id)
     return {"message": "Group deleted successfully"}
 
 
+@app.get("/search")
+async def search(q: str,
+                 limit: int = 20,
+                 cursor: str | None = None,
+                 username: str = Depends(get_current_username),
+                 db: Session = Depends(get_db)):
+    """Full-text search over the messages of the caller's chats, paginated with ``next_cursor``."""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User does not exist")
+    try:
+        return {"query": q, **search_messages(db, user.id, q, min(max(limit, 1), 100), cursor)}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/unread")
+async def unread_counts(username: str = Depends(get_current_username), db: Session = Depends(get_db)):
+    """Unread counters and read cursors of all the caller's chats."""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User does not exist")
+    return {"chats": get_unread_counts(db, user.id)}
+
+
+@app.get("/inbox")
+async def inbox(cursor: str | None = None,
+                limit: int = 20,
+                username: str = Depends(get_current_username),
+                db: Session = Depends(get_db)):
+    """The caller's chats sorted by their last message, paginated with ``next_cursor``."""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User does not exist")
+    try:
+        return get_inbox(db, user.id, cursor, min(max(limit, 1), 100))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/attachments/{attachment_id}")
+async def download_attachment(attachment_id: int,
+                              username: str = Depends(get_current_username),
+                              db: Session = Depends(get_db)):
+    """Serve an attachment; FileResponse answers Range requests and uses pathsend when the server has it."""
+    user = db.query(User).filter(User.username == username).first()
+    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+    if not user or not attachment or not can_read_attachment(db, user.id, attachment):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return FileResponse(
+        blob_path(attachment.sha256),
+        media_type=attachment.content_type,
+        filename=attachment.filename,
+        headers={"Cache-Control": "private, max-age=31536000, immutable"}
+    )
+
+
+@app.get("/ws/stats")
+async def websocket_stats(top: int = Query(0, ge=0, le=1000), username: str = Depends(get_current_username)):
+    """Gauges of the WebSocket connection registry, with the ``top`` largest connections.
+
+    The password hashing pool and the verified token cache are reported too.
+    """
+    stats = connection_manager.stats(top)
+    stats["password_hashing"] = password_hasher.stats()
+    stats["token_cache"] = token_cache.stats()
+    return stats
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
     await websocket.accept()
+    # Counted against MAX_CONNECTIONS from here on, so sockets that never authenticate are limited too
+    if not await connection_manager.admit(websocket):
+        return
     try:
         # Initial connection authentication
-        data = await websocket.receive_text()
+        try:
+            data = await asyncio.wait_for(websocket.receive_text(), timeout=WS_AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            connection_manager.disconnect(websocket)
+            await websocket.close(code=1008, reason="Authentication timeout")
+            return
         message = json.loads(data)
         access_token = message.get("access_token")
         csrf_token = message.get("csrf_token")
         if not access_token or not csrf_token:
+            connection_manager.disconnect(websocket)
             await websocket.close(code=1008, reason="Missing authentication tokens")
             return
 
-        await connection_manager.connect(websocket, csrf_token, access_token)
+        await connection_manager.connect(websocket, csrf_token, access_token, message.get("coalesce"))
+        user_info = connection_manager.get_user_info(websocket)
+        if not user_info:
+            # Refused by authentication or admission control, the socket is closed
+            return
+        traffic_recorder.open(websocket, user_info["username"], message)
         await handle_websocket_action(websocket, message, db)
+        db.close()
         # Handle subsequent WebSocket messages
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if frame.get("bytes") is not None:
+                # Binary frames carry attachment upload chunks
+                connection_manager.touch(websocket)
+                traffic_recorder.record_bytes(websocket, frame["bytes"])
+                await attachment_uploads.receive_chunk(websocket, frame["bytes"], db)
+                db.close()
+                continue
+            message = json.loads(frame["text"])
+            traffic_recorder.record(websocket, message)
+            connection_manager.touch(websocket, active=message.get("action") != "pong")
             await handle_websocket_action(websocket, message, db)
+            # Return the pooled DB connection between frames; an idle socket must not pin one
+            db.close()
 
     except WebSocketDisconnect:
         connection_manager.disconnect(websocket)
+        attachment_uploads.discard(websocket)
+        traffic_recorder.close(websocket)
         print("Client disconnected")
     except Exception as e:
         print(f"Error: {str(e)}")
         connection_manager.disconnect(websocket)
-        await websocket.close(code=1008, reason="Unexpected error")
+        attachment_uploads.discard(websocket)
+        traffic_recorder.close(websocket)
+        # The socket may already be closed, e.g. by the heartbeat reaper
+        if websocket.application_state != WebSocketState.DISCONNECTED:
+            await websocket.close(code=1008, reason="Unexpected error")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Table, Boolean, false, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -33,12 +33,14 @@ class PrivateChat(Base):
 class PrivateMessage(Base):
     __tablename__ = "private_messages"
     id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer, ForeignKey("private_chats.id"))
+    chat_id = Column(Integer, ForeignKey("private_chats.id"), index=True)
     sender_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    attachment_id = Column(Integer, ForeignKey("attachments.id"), nullable=True, index=True)
 
     chat = relationship("PrivateChat", back_populates="messages")
+    attachment = relationship("Attachment")
 
 
 class GroupChat(Base):
@@ -46,16 +48,87 @@ class GroupChat(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     admin_id = Column(Integer, ForeignKey("users.id"))  # Optionally track the group admin
+    # Set on deletion, the rows are purged later by app.utils.group_purge
+    is_deleted = Column(Boolean, default=False, server_default=false(), nullable=False)
     users = relationship("User", secondary=group_user_association, back_populates="groups")
-    messages = relationship("GroupMessage", back_populates="group", cascade="all, delete-orphan")
+    # passive_deletes: never load the whole history just to delete it
+    messages = relationship("GroupMessage", back_populates="group", cascade="all, delete-orphan",
+                            passive_deletes=True)
 
 
 class GroupMessage(Base):
     __tablename__ = "group_messages"
     id = Column(Integer, primary_key=True, index=True)
-    group_id = Column(Integer, ForeignKey("group_chats.id"))
+    group_id = Column(Integer, ForeignKey("group_chats.id"), index=True)
     sender_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    attachment_id = Column(Integer, ForeignKey("attachments.id"), nullable=True, index=True)
 
-    group = relationship("GroupChat", back_populates="messages")
\ No newline at end of file
+    group = relationship("GroupChat", back_populates="messages")
+    attachment = relationship("Attachment")
+
+
+class Attachment(Base):
+    """Uploaded file, stored once on disk under its SHA-256 digest."""
+    __tablename__ = "attachments"
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String)
+    filename = Column(String)
+    uploader_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedAttachment(Base):
+    """Chat an attachment was sent in, kept once the message moved to the archive."""
+    __tablename__ = "archived_attachments"
+    attachment_id = Column(Integer, ForeignKey("attachments.id"), primary_key=True)
+    chat_type = Column(String, primary_key=True)  # "private" or "group"
+    chat_id = Column(Integer, primary_key=True)
+
+
+class ReadCursor(Base):
+    """Read position and unread counter of one user in one chat."""
+    __tablename__ = "read_cursors"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    chat_type = Column(String, primary_key=True)  # "private" or "group"
+    chat_id = Column(Integer, primary_key=True)
+    last_read_message_id = Column(Integer, default=0, nullable=False)
+    unread_count = Column(Integer, default=0, nullable=False)
+    # Copy of the chat's last message time, so the inbox is one index range per user
+    last_message_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_read_cursors_chat", "chat_type", "chat_id"),
+        Index("ix_read_cursors_inbox", "user_id", "last_message_at", "chat_type", "chat_id"),
+    )
+
+
+class ConversationSummary(Base):
+    """Last message of a chat, maintained when messages are persisted."""
+    __tablename__ = "conversation_summaries"
+    chat_type = Column(String, primary_key=True)  # "private" or "group"
+    chat_id = Column(Integer, primary_key=True)
+    last_message_id = Column(Integer, nullable=False)
+    sender_username = Column(String)
+    preview = Column(Text)
+    last_message_at = Column(DateTime)
+
+
+class ArchiveSegment(Base):
+    """Index entry of a compressed, append-only file of archived messages of one chat."""
+    __tablename__ = "archive_segments"
+    id = Column(Integer, primary_key=True, index=True)
+    chat_type = Column(String, nullable=False)  # "private" or "group"
+    chat_id = Column(Integer, nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    path = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_archive_segments_chat_last_id", "chat_type", "chat_id", "last_message_id"),
+    )
\ No newline at end of file
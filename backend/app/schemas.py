@@ -42,3 +42,7 @@ class GroupChatResponse(BaseModel):
 class GroupChatRequest(BaseModel):
     group_name: str
     admin_username: str
+
+
+class GroupMembersRequest(BaseModel):
+    user_ids: list[int]
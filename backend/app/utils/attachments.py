@@ -0,0 +1,69 @@
+import os
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import ATTACHMENTS_DIR
+from app.models import ArchivedAttachment, Attachment, GroupMessage, PrivateMessage
+from app.utils.message_search import user_chat_ids
+
+
+def blob_path(sha256: str) -> str:
+    """Content-addressed location of a stored file."""
+    return os.path.join(ATTACHMENTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def upload_dir() -> str:
+    path = os.path.join(ATTACHMENTS_DIR, "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def store_blob(tmp_path: str, sha256: str) -> str:
+    """Move a finished upload to its content address; identical content is kept once."""
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path
+
+
+def attachment_metadata(attachment: Attachment | None) -> dict | None:
+    """What history and message frames carry instead of the file itself."""
+    if attachment is None:
+        return None
+    return {
+        "id": attachment.id,
+        "filename": attachment.filename,
+        "content_type": attachment.content_type,
+        "size": attachment.size,
+        "url": f"/attachments/{attachment.id}",
+    }
+
+
+def can_read_attachment(db: Session, user_id: int, attachment: Attachment) -> bool:
+    """The uploader, and members of any chat where the attachment was sent, may download it.
+
+    Messages moved to the archive are covered by ``archived_attachments``.
+    """
+    if attachment.uploader_id == user_id:
+        return True
+    group_ids, private_ids = user_chat_ids(db, user_id)
+    in_group = db.query(GroupMessage.id).filter(
+        GroupMessage.attachment_id == attachment.id,
+        GroupMessage.group_id.in_(group_ids)
+    )
+    in_private = db.query(PrivateMessage.id).filter(
+        PrivateMessage.attachment_id == attachment.id,
+        PrivateMessage.chat_id.in_(private_ids)
+    )
+    in_archive = db.query(ArchivedAttachment.attachment_id).filter(
+        ArchivedAttachment.attachment_id == attachment.id,
+        or_(
+            and_(ArchivedAttachment.chat_type == "group", ArchivedAttachment.chat_id.in_(group_ids)),
+            and_(ArchivedAttachment.chat_type == "private", ArchivedAttachment.chat_id.in_(private_ids))
+        )
+    )
+    return db.query(or_(in_group.exists(), in_private.exists(), in_archive.exists())).scalar()
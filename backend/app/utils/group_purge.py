@@ -0,0 +1,63 @@
+from sqlalchemy import delete, select
+
+from app.config import GROUP_PURGE_CHUNK
+from app.database import SessionLocal
+from app.models import ConversationSummary, GroupChat, GroupMessage, ReadCursor, group_user_association
+from app.utils.message_archive import delete_segments
+from app.utils.message_search import delete_chat_from_index
+
+
+def purge_group(group_id: int, chunk_size: int = GROUP_PURGE_CHUNK):
+    """Delete a group marked as deleted with its messages, archive, search index rows and memberships.
+
+    Rows are removed with bulk DELETEs of at most ``chunk_size`` rows, each in its
+    own short transaction, so a big group never holds the write lock for long and
+    no message is loaded into memory.
+    """
+    db = SessionLocal()
+    try:
+        group = db.query(GroupChat).filter(GroupChat.id == group_id).first()
+        if not group or not group.is_deleted:
+            return
+
+        while True:
+            chunk = select(GroupMessage.id).where(GroupMessage.group_id == group_id).limit(chunk_size)
+            result = db.execute(delete(GroupMessage).where(GroupMessage.id.in_(chunk)))
+            db.commit()
+            if result.rowcount < chunk_size:
+                break
+
+        delete_segments(db, "group", group_id)
+        delete_chat_from_index(db, "group", group_id, chunk_size)
+
+        members = group_user_association.c
+        while True:
+            chunk = select(members.user_id).where(members.group_id == group_id).limit(chunk_size)
+            result = db.execute(
+                delete(group_user_association)
+                .where(members.group_id == group_id, members.user_id.in_(chunk))
+            )
+            db.commit()
+            if result.rowcount < chunk_size:
+                break
+
+        db.execute(delete(ReadCursor).where(ReadCursor.chat_type == "group", ReadCursor.chat_id == group_id))
+        db.execute(delete(ConversationSummary).where(
+            ConversationSummary.chat_type == "group", ConversationSummary.chat_id == group_id
+        ))
+        db.execute(delete(GroupChat).where(GroupChat.id == group_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def purge_deleted_groups():
+    """Finish purges interrupted by a restart."""
+    db = SessionLocal()
+    try:
+        group_ids = [group_id for (group_id,) in
+                     db.query(GroupChat.id).filter(GroupChat.is_deleted.is_(True)).all()]
+    finally:
+        db.close()
+    for group_id in group_ids:
+        purge_group(group_id)
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from sqlalchemy import case, exists, or_, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, aliased
+
+from app.config import INBOX_PREVIEW_LENGTH
+from app.models import ConversationSummary, GroupChat, PrivateChat, ReadCursor, User, group_user_association
+
+
+def update_conversation_summary(db: Session, chat_type: str, chat_id: int, message, sender_username: str):
+    """Store ``message`` as the last message of the chat, in the caller's transaction."""
+    values = {
+        "last_message_id": message.id,
+        "sender_username": sender_username,
+        "preview": (message.content or "")[:INBOX_PREVIEW_LENGTH],
+        "last_message_at": message.timestamp,
+    }
+    db.execute(
+        insert(ConversationSummary)
+        .values(chat_type=chat_type, chat_id=chat_id, **values)
+        .on_conflict_do_update(index_elements=["chat_type", "chat_id"], set_=values)
+    )
+
+
+def encode_cursor(timestamp: datetime, chat_type: str, chat_id: int) -> str:
+    return f"{timestamp.isoformat()},{chat_type},{chat_id}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor, raises ValueError on a malformed cursor."""
+    timestamp, chat_type, chat_id = cursor.split(",")
+    return datetime.fromisoformat(timestamp), chat_type, int(chat_id)
+
+
+def get_inbox(db: Session, user_id: int, cursor: str | None = None, limit: int = 20) -> dict:
+    """Chats of a user that have messages, most recent first, with their last message.
+
+    One query walks the user's ``ix_read_cursors_inbox`` range and joins the
+    summaries and chat names by primary key. Group rows are only listed
+    while the user still is a member or the admin of the group.
+    """
+    peer = aliased(User)
+    members = group_user_association.c
+    query = (
+        db.query(ReadCursor, ConversationSummary, GroupChat.name, peer.username)
+        .join(ConversationSummary, (ConversationSummary.chat_type == ReadCursor.chat_type)
+              & (ConversationSummary.chat_id == ReadCursor.chat_id))
+        .outerjoin(GroupChat, (ReadCursor.chat_type == "group") & (GroupChat.id == ReadCursor.chat_id))
+        .outerjoin(PrivateChat, (ReadCursor.chat_type == "private") & (PrivateChat.id == ReadCursor.chat_id))
+        .outerjoin(peer, peer.id == case((PrivateChat.user1_id == user_id, PrivateChat.user2_id),
+                                         else_=PrivateChat.user1_id))
+        .filter(
+            ReadCursor.user_id == user_id,
+            ReadCursor.last_message_at.isnot(None),
+            or_(GroupChat.id.is_(None), GroupChat.is_deleted.is_(False)),
+            or_(
+                ReadCursor.chat_type == "private",
+                GroupChat.admin_id == user_id,
+                exists().where(members.group_id == ReadCursor.chat_id, members.user_id == user_id)
+            )
+        )
+    )
+    if cursor:
+        query = query.filter(
+            tuple_(ReadCursor.last_message_at, ReadCursor.chat_type, ReadCursor.chat_id) < tuple_(*decode_cursor(cursor))
+        )
+    rows = (
+        query.order_by(ReadCursor.last_message_at.desc(), ReadCursor.chat_type.desc(), ReadCursor.chat_id.desc())
+        .limit(limit)
+        .all()
+    )
+
+    conversations = [
+        {
+            "chat_type": read_cursor.chat_type,
+            "chat_id": read_cursor.chat_id,
+            "group_name": group_name,
+            "peer_username": peer_username,
+            "unread_count": read_cursor.unread_count,
+            "last_read_message_id": read_cursor.last_read_message_id,
+            "last_message": {
+                "id": summary.last_message_id,
+                "sender_username": summary.sender_username,
+                "preview": summary.preview,
+                "timestamp": summary.last_message_at.isoformat() if summary.last_message_at else None,
+            },
+        }
+        for read_cursor, summary, group_name, peer_username in rows
+    ]
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.last_message_at, last.chat_type, last.chat_id)
+    return {"conversations": conversations, "next_cursor": next_cursor}
@@ -0,0 +1,239 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.config import MESSAGE_RETENTION_DAYS, RETENTION_INTERVAL, RETENTION_BATCH, ARCHIVE_DIR
+from app.database import SessionLocal
+from app.models import (
+    ArchiveSegment, ArchivedAttachment, Attachment, GroupChat, GroupMessage, PrivateMessage, User
+)
+from app.utils.attachments import attachment_metadata
+
+# chat_type -> (message model, column holding the chat id)
+MESSAGE_MODELS = {
+    "private": (PrivateMessage, PrivateMessage.chat_id),
+    "group": (GroupMessage, GroupMessage.group_id),
+}
+
+
+def segment_path(chat_type: str, chat_id: int, first_id: int, last_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{chat_type}_{chat_id}", f"{first_id:012d}-{last_id:012d}.jsonl.gz")
+
+
+def write_segment(path: str, messages: list):
+    """Write archived messages (ordered by id) as a gzipped JSON-lines file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as segment:
+        for message in messages:
+            segment.write(json.dumps(message, separators=(",", ":")) + "\n")
+    # Segments are immutable once visible under their final name
+    os.replace(tmp_path, path)
+
+
+def read_segment(path: str) -> list:
+    with gzip.open(path, "rt", encoding="utf-8") as segment:
+        return [json.loads(line) for line in segment]
+
+
+def oldest_archivable_chat(db: Session, chat_type: str, cutoff: datetime) -> int | None:
+    """Id of the chat holding the oldest message older than ``cutoff``, skipping deleted groups.
+
+    Deleted groups are left to ``purge_group``; archiving them would only
+    write segments that the purge deletes again.
+    """
+    model, chat_column = MESSAGE_MODELS[chat_type]
+    query = db.query(chat_column).filter(model.timestamp < cutoff)
+    if chat_type == "group":
+        query = query.join(GroupChat, GroupChat.id == chat_column).filter(GroupChat.is_deleted.is_(False))
+    row = query.order_by(model.id).first()
+    return row[0] if row else None
+
+
+def archive_batch(db: Session, chat_type: str, cutoff: datetime, batch_size: int = RETENTION_BATCH) -> int:
+    """Move up to ``batch_size`` old messages of one chat into a single archive segment.
+
+    The chat is the one holding the oldest message older than ``cutoff``, so
+    each segment is as large as the batch allows instead of a sliver per chat.
+    The segment file is written before the transaction that indexes it and
+    deletes the hot rows, so a crash in between leaves at worst an unreferenced
+    file. Archived attachments are linked to the chat so the files stay
+    downloadable.
+    """
+    model, chat_column = MESSAGE_MODELS[chat_type]
+    chat_id = oldest_archivable_chat(db, chat_type, cutoff)
+    if chat_id is None:
+        return 0
+    rows = (
+        db.query(model, User.username, Attachment)
+        .outerjoin(User, User.id == model.sender_id)
+        .outerjoin(Attachment, Attachment.id == model.attachment_id)
+        .filter(chat_column == chat_id, model.timestamp < cutoff)
+        .order_by(model.id)
+        .limit(batch_size)
+        .all()
+    )
+
+    messages = [
+        {
+            "id": message.id,
+            "sender_id": message.sender_id,
+            "sender_username": username,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+            "attachment": attachment_metadata(attachment),
+        }
+        for message, username, attachment in rows
+    ]
+    first_id, last_id = messages[0]["id"], messages[-1]["id"]
+    path = segment_path(chat_type, chat_id, first_id, last_id)
+    write_segment(path, messages)
+    db.add(ArchiveSegment(
+        chat_type=chat_type,
+        chat_id=chat_id,
+        first_message_id=first_id,
+        last_message_id=last_id,
+        message_count=len(messages),
+        path=path,
+    ))
+    attachment_ids = {attachment.id for _, _, attachment in rows if attachment is not None}
+    if attachment_ids:
+        db.execute(
+            insert(ArchivedAttachment).on_conflict_do_nothing(),
+            [{"attachment_id": attachment_id, "chat_type": chat_type, "chat_id": chat_id}
+             for attachment_id in attachment_ids]
+        )
+    db.execute(
+        delete(model).where(model.id.in_([message.id for message, _, _ in rows])),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return len(rows)
+
+
+def delete_segments(db: Session, chat_type: str, chat_id: int):
+    """Drop the archive of a chat that is being purged, index rows first, then the files.
+
+    SQLite can hand the id of a purged chat to a new one, which must not
+    inherit its archived history. A crash between the commit and the unlink
+    leaves at worst unreferenced files.
+    """
+    paths = [path for (path,) in db.query(ArchiveSegment.path).filter(
+        ArchiveSegment.chat_type == chat_type, ArchiveSegment.chat_id == chat_id
+    )]
+    db.execute(delete(ArchiveSegment).where(
+        ArchiveSegment.chat_type == chat_type, ArchiveSegment.chat_id == chat_id
+    ))
+    db.execute(delete(ArchivedAttachment).where(
+        ArchivedAttachment.chat_type == chat_type, ArchivedAttachment.chat_id == chat_id
+    ))
+    db.commit()
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(os.path.join(ARCHIVE_DIR, f"{chat_type}_{chat_id}"), ignore_errors=True)
+
+
+def apply_retention(retention_days: float = MESSAGE_RETENTION_DAYS, batch_size: int = RETENTION_BATCH) -> int:
+    """Archive every message older than the retention threshold, one short transaction per batch."""
+    if not retention_days:
+        return 0
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    archived = 0
+    db = SessionLocal()
+    try:
+        for chat_type in MESSAGE_MODELS:
+            # A short batch only means one chat ran out, so go on until nothing is left
+            while count := archive_batch(db, chat_type, cutoff, batch_size):
+                archived += count
+    finally:
+        db.close()
+    return archived
+
+
+def get_history(db: Session, chat_type: str, chat_id: int, before_id: int | None = None, limit: int = 50) -> list:
+    """Return up to ``limit`` messages of a chat older than ``before_id``, oldest first.
+
+    The hot table is read first; when it runs out the page continues from the
+    archive segments of the chat.
+    """
+    model, chat_column = MESSAGE_MODELS[chat_type]
+    query = (
+        db.query(model, User.username, Attachment)
+        .outerjoin(User, User.id == model.sender_id)
+        .outerjoin(Attachment, Attachment.id == model.attachment_id)
+        .filter(chat_column == chat_id)
+    )
+    if before_id is not None:
+        query = query.filter(model.id < before_id)
+    page = [
+        {
+            "id": message.id,
+            "sender_username": username,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+            "attachment": attachment_metadata(attachment),
+        }
+        for message, username, attachment in query.order_by(model.id.desc()).limit(limit)
+    ]
+
+    cursor = page[-1]["id"] if page else before_id
+    segments = db.query(ArchiveSegment).filter(
+        ArchiveSegment.chat_type == chat_type,
+        ArchiveSegment.chat_id == chat_id,
+    )
+    if cursor is not None:
+        segments = segments.filter(ArchiveSegment.first_message_id < cursor)
+    for segment in segments.order_by(ArchiveSegment.last_message_id.desc()):
+        if len(page) >= limit:
+            break
+        for message in reversed(read_segment(segment.path)):
+            if cursor is not None and message["id"] >= cursor:
+                continue
+            message.pop("sender_id", None)
+            page.append(message)
+            if len(page) >= limit:
+                break
+
+    page.reverse()
+    return page
+
+
+class RetentionWorker:
+    """Periodically archive old messages in a worker thread."""
+
+    def __init__(self, interval: float = RETENTION_INTERVAL, retention_days: float = MESSAGE_RETENTION_DAYS):
+        self.interval = interval
+        self.retention_days = retention_days
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.retention_days and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, apply_retention, self.retention_days)
+            except Exception as e:
+                print(f"Retention error: {str(e)}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,325 @@
+import re
+import unicodedata
+from datetime import datetime
+
+from sqlalchemy import select, text, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import SEARCH_RANK_WINDOW
+from app.models import ArchiveSegment, GroupChat, PrivateChat, group_user_association
+
+# Words as the unicode61 tokenizer splits them: letters and digits, "_" separates
+WORD = re.compile(r"[^\W_]+")
+
+# FTS5 rowids are time ordered so the most recent matches are read first, across both
+# message tables: unix seconds << 22 | message id (low 21 bits) << 1 | 0 group / 1 private.
+# ``room`` holds one token per chat ("g12", "p3") so scoping is part of the MATCH.
+# Sender and time are stored with the text, so archived messages stay searchable
+# after retention deletes their rows.
+SEARCH_ROWID = ("((coalesce(CAST(strftime('%s', {timestamp}) AS INTEGER), 0) << 22)"
+                " | (({message_id} % 2097152) << 1) | {chat_bit})")
+
+SEARCH_TABLE_DDL = """
+CREATE VIRTUAL TABLE message_search USING fts5(
+    content,
+    room,
+    chat_type UNINDEXED,
+    chat_id UNINDEXED,
+    message_id UNINDEXED,
+    sender_username UNINDEXED,
+    timestamp UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+INSERT_GROUP_MESSAGE = f"""
+    INSERT INTO message_search (rowid, content, room, chat_type, chat_id, message_id, sender_username, timestamp)
+    SELECT {SEARCH_ROWID.format(timestamp="m.timestamp", message_id="m.id", chat_bit=0)},
+           m.content, 'g' || m.group_id, 'group', m.group_id, m.id,
+           (SELECT username FROM users WHERE id = m.sender_id), m.timestamp
+"""
+
+INSERT_PRIVATE_MESSAGE = f"""
+    INSERT INTO message_search (rowid, content, room, chat_type, chat_id, message_id, sender_username, timestamp)
+    SELECT {SEARCH_ROWID.format(timestamp="m.timestamp", message_id="m.id", chat_bit=1)},
+           m.content, 'p' || m.chat_id, 'private', m.chat_id, m.id,
+           (SELECT username FROM users WHERE id = m.sender_id), m.timestamp
+"""
+
+# Only inserts and edits are mirrored: rows deleted by the retention job stay
+# indexed with the archive, purged chats are removed by delete_chat_from_index
+SEARCH_TRIGGERS_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS group_messages_search_insert AFTER INSERT ON group_messages BEGIN
+        {INSERT_GROUP_MESSAGE} FROM (SELECT new.id AS id, new.group_id AS group_id, new.sender_id AS sender_id,
+                                            new.content AS content, new.timestamp AS timestamp) AS m;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS group_messages_search_update AFTER UPDATE OF content ON group_messages BEGIN
+        UPDATE message_search SET content = new.content
+        WHERE rowid = {SEARCH_ROWID.format(timestamp="new.timestamp", message_id="new.id", chat_bit=0)};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS private_messages_search_insert AFTER INSERT ON private_messages BEGIN
+        {INSERT_PRIVATE_MESSAGE} FROM (SELECT new.id AS id, new.chat_id AS chat_id, new.sender_id AS sender_id,
+                                              new.content AS content, new.timestamp AS timestamp) AS m;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS private_messages_search_update AFTER UPDATE OF content ON private_messages BEGIN
+        UPDATE message_search SET content = new.content
+        WHERE rowid = {SEARCH_ROWID.format(timestamp="new.timestamp", message_id="new.id", chat_bit=1)};
+    END
+    """,
+]
+
+# Triggers of earlier index layouts, dropped when the index is rebuilt
+OLD_SEARCH_TRIGGERS = [
+    "group_messages_search_insert", "group_messages_search_delete", "group_messages_search_update",
+    "private_messages_search_insert", "private_messages_search_delete", "private_messages_search_update",
+]
+
+INSERT_ARCHIVED_MESSAGE = f"""
+    INSERT INTO message_search (rowid, content, room, chat_type, chat_id, message_id, sender_username, timestamp)
+    VALUES ({SEARCH_ROWID.format(timestamp=":timestamp", message_id=":message_id", chat_bit=":chat_bit")},
+            :content, :room, :chat_type, :chat_id, :message_id, :sender_username, :timestamp)
+"""
+
+# BM25 parameters, the same defaults as FTS5's bm25()
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def backfill_search_index(connection):
+    """Index every hot and archived message."""
+    # message_archive depends on this module through attachments
+    from app.utils.message_archive import read_segment
+
+    connection.execute(text(f"{INSERT_GROUP_MESSAGE} FROM group_messages AS m"))
+    connection.execute(text(f"{INSERT_PRIVATE_MESSAGE} FROM private_messages AS m"))
+    segments = connection.execute(
+        select(ArchiveSegment.chat_type, ArchiveSegment.chat_id, ArchiveSegment.path).order_by(ArchiveSegment.id)
+    ).all()
+    for chat_type, chat_id, path in segments:
+        connection.execute(text(INSERT_ARCHIVED_MESSAGE), [
+            {
+                "chat_bit": 0 if chat_type == "group" else 1,
+                "content": message["content"],
+                "room": f"{chat_type[0]}{chat_id}",
+                "chat_type": chat_type,
+                "chat_id": chat_id,
+                "message_id": message["id"],
+                "sender_username": message.get("sender_username"),
+                "timestamp": message.get("timestamp"),
+            }
+            for message in read_segment(path)
+        ])
+
+
+def create_search_index(engine: Engine):
+    """Create the FTS5 index and its sync triggers, backfilling it on first creation.
+
+    An index built with an earlier layout is dropped and rebuilt, archived
+    messages included.
+    """
+    with engine.begin() as connection:
+        existing = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'message_search'")
+        ).scalar()
+        if existing is not None and " ".join(existing.split()) != " ".join(SEARCH_TABLE_DDL.split()):
+            for trigger in OLD_SEARCH_TRIGGERS:
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            connection.execute(text("DROP TABLE message_search"))
+            existing = None
+        if existing is None:
+            connection.execute(text(SEARCH_TABLE_DDL))
+            backfill_search_index(connection)
+        for statement in SEARCH_TRIGGERS_DDL:
+            connection.execute(text(statement))
+
+
+def delete_chat_from_index(db: Session, chat_type: str, chat_id: int, chunk_size: int):
+    """Remove a purged chat from the index, ``chunk_size`` rows per transaction."""
+    room = f'room : "{chat_type[0]}{chat_id}"'
+    while True:
+        result = db.execute(text("""
+            DELETE FROM message_search WHERE rowid IN (
+                SELECT rowid FROM message_search WHERE message_search MATCH :room LIMIT :chunk
+            )
+        """), {"room": room, "chunk": chunk_size})
+        db.commit()
+        if result.rowcount < chunk_size:
+            break
+
+
+def normalize(word: str) -> str:
+    """Fold case and diacritics like ``unicode61 remove_diacritics 2``."""
+    if word.isascii():
+        return word.lower()
+    decomposed = unicodedata.normalize("NFKD", word.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(content: str) -> list:
+    content = (content or "").lower()
+    if content.isascii():
+        return WORD.findall(content)
+    return [normalize(word) for word in WORD.findall(content)]
+
+
+def query_words(query: str) -> list:
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def to_match_query(words: list, group_ids: list, private_ids: list) -> str:
+    """FTS5 query for messages containing every word, limited to the given chats."""
+    terms = [f'"{word}"' for word in words]
+    rooms = [f"g{group_id}" for group_id in group_ids] + [f"p{chat_id}" for chat_id in private_ids]
+    return f"content : ({' '.join(terms)}) AND room : ({' OR '.join(rooms)})"
+
+
+def score_window(candidates: list, words: list) -> dict:
+    """BM25 of every candidate, rowid -> score, higher is better.
+
+    Every candidate contains every query word, so only term frequency and
+    message length set them apart. The IDF factor is left out: FTS5 can only
+    tell how many messages contain a word by walking its whole posting list,
+    hundreds of milliseconds for a common word. ``avgdl`` is the mean length
+    of the window.
+    """
+    tokens = {candidate.rowid: tokenize(candidate.content) for candidate in candidates}
+    average = sum(len(words_of) for words_of in tokens.values()) / len(tokens) or 1
+    scores = {}
+    for rowid, words_of in tokens.items():
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(words_of) / average)
+        scores[rowid] = sum(
+            frequency * (BM25_K1 + 1) / (frequency + norm)
+            for frequency in (words_of.count(word) for word in words)
+        )
+    return scores
+
+
+def make_snippet(content: str, words: list, size: int = 12) -> str:
+    """Up to ``size`` words around the first hit, hits in [brackets]."""
+    tokens = list(WORD.finditer(content or ""))
+    hits = [index for index, token in enumerate(tokens) if normalize(token.group()) in words]
+    if not hits:
+        return (content or "")[:200]
+    start = max(0, min(hits[0] - size // 4, len(tokens) - size))
+    end = min(len(tokens), start + size)
+    parts = []
+    position = tokens[start].start()
+    for index in range(start, end):
+        token = tokens[index]
+        parts.append(content[position:token.start()])
+        parts.append(f"[{token.group()}]" if index in hits else token.group())
+        position = token.end()
+    if end == len(tokens):
+        parts.append(content[position:])
+    snippet = "".join(parts)
+    return f"{'...' if start else ''}{snippet}{'...' if end < len(tokens) else ''}"
+
+
+def encode_cursor(before: int, score: float, rowid: int) -> str:
+    return f"{before},{score!r},{rowid}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor, raises ValueError on a malformed cursor."""
+    before, score, rowid = cursor.split(",")
+    return int(before), float(score), int(rowid)
+
+
+def user_chat_ids(db: Session, user_id: int) -> tuple[list, list]:
+    """Ids of the group chats and private chats a user belongs to."""
+    members = group_user_association.c
+    group_ids = [
+        group_id for (group_id,) in
+        db.query(GroupChat.id)
+        .outerjoin(group_user_association,
+                   (members.group_id == GroupChat.id) & (members.user_id == user_id))
+        .filter(GroupChat.is_deleted.is_(False),
+                or_(GroupChat.admin_id == user_id, members.user_id.isnot(None)))
+        .distinct()
+    ]
+    private_ids = [
+        chat_id for (chat_id,) in
+        db.query(PrivateChat.id).filter(or_(PrivateChat.user1_id == user_id, PrivateChat.user2_id == user_id))
+    ]
+    return group_ids, private_ids
+
+
+def search_messages(db: Session, user_id: int, query: str, limit: int = 20, cursor: str | None = None,
+                    rank_window: int = SEARCH_RANK_WINDOW) -> dict:
+    """Full-text search over the messages of the chats the user belongs to, archive included.
+
+    Matches are read newest first in windows of ``rank_window``; each window
+    is ranked by BM25 (see ``score_window``) and paged with a keyset on
+    (score, rowid), then the next older window follows. A page costs one
+    window however common the words are, and every match is reachable.
+    Raises ValueError on a malformed ``cursor``.
+    """
+    words = query_words(query)
+    group_ids, private_ids = user_chat_ids(db, user_id)
+    if not words or (not group_ids and not private_ids):
+        return {"results": [], "next_cursor": None}
+    match = to_match_query(words, group_ids, private_ids)
+    before, after = None, None
+    if cursor:
+        before, score, rowid = decode_cursor(cursor)
+        after = (-score, -rowid)
+
+    page = []
+    next_cursor = None
+    while True:
+        candidates = db.execute(text(f"""
+            SELECT rowid, content, chat_type, chat_id, message_id, sender_username, timestamp
+            FROM message_search
+            WHERE message_search MATCH :match {'AND rowid < :before' if before is not None else ''}
+            ORDER BY rowid DESC
+            LIMIT :window
+        """), {"match": match, "before": before, "window": rank_window}).all()
+        if not candidates:
+            break
+        if before is None:
+            # Pin the window so later pages rank the same messages
+            before = candidates[0].rowid + 1
+        scores = score_window(candidates, words)
+        ranked = sorted(candidates, key=lambda candidate: (-scores[candidate.rowid], -candidate.rowid))
+        if after is not None:
+            ranked = [candidate for candidate in ranked if (-scores[candidate.rowid], -candidate.rowid) > after]
+        taken = ranked[:limit - len(page)]
+        page.extend((candidate, scores[candidate.rowid]) for candidate in taken)
+        if len(page) == limit and (len(taken) < len(ranked) or len(candidates) == rank_window):
+            last, score = page[-1]
+            next_cursor = encode_cursor(before, score, last.rowid)
+            break
+        if len(candidates) < rank_window:
+            break
+        # This window is used up, continue with the older matches
+        before = candidates[-1].rowid
+        after = None
+
+    group_names = dict(
+        db.query(GroupChat.id, GroupChat.name)
+        .filter(GroupChat.id.in_({hit.chat_id for hit, _ in page if hit.chat_type == "group"}))
+        .all()
+    )
+    results = [
+        {
+            "chat_type": hit.chat_type,
+            "chat_id": hit.chat_id,
+            "group_name": group_names.get(hit.chat_id) if hit.chat_type == "group" else None,
+            "id": hit.message_id,
+            "sender_username": hit.sender_username,
+            "content": hit.content,
+            "snippet": make_snippet(hit.content, words),
+            "timestamp": datetime.fromisoformat(hit.timestamp).isoformat() if hit.timestamp else None,
+            "score": score,
+        }
+        for hit, score in page
+    ]
+    return {"results": results, "next_cursor": next_cursor}
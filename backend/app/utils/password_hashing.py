@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+
+# Hashes with a different cost factor are flagged by needs_update and rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def worker_context():
+    """Start workers from a fork server where available.
+
+    Forking the server process directly would copy its event loop, open
+    sockets and database connections into every worker; Windows only has spawn.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def hash_in_worker(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_in_worker(password: str, hashed_password: str) -> tuple:
+    """(matches, new hash or None), the new hash when the stored cost factor is outdated."""
+    try:
+        return pwd_context.verify_and_update(password, hashed_password)
+    except ValueError:
+        # Not a hash passlib recognises, e.g. an empty column
+        return False, None
+
+
+class PasswordHashPool:
+    """Run bcrypt in worker processes so it neither blocks the event loop nor holds the GIL.
+
+    At most ``max_queue`` hashes may be running or waiting; past that
+    callers get a 503 instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, function, *args):
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many authentication requests, try again later",
+                                headers={"Retry-After": "1"})
+        self.start()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_in_worker, password)
+
+    async def verify(self, password: str, hashed_password: str) -> tuple:
+        """(matches, new hash or None), see ``verify_in_worker``."""
+        return await self._submit(verify_in_worker, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
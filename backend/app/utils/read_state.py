@@ -0,0 +1,109 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, bindparam, delete, func, text
+from sqlalchemy.orm import Session
+
+from app.models import GroupChat, ReadCursor
+from app.utils.message_archive import MESSAGE_MODELS
+
+CHAT_MEMBERS = {
+    "group": """
+        SELECT user_id AS member_id FROM group_users WHERE group_id = :chat_id
+        UNION SELECT admin_id FROM group_chats WHERE id = :chat_id
+    """,
+    "private": """
+        SELECT user1_id AS member_id FROM private_chats WHERE id = :chat_id
+        UNION SELECT user2_id FROM private_chats WHERE id = :chat_id
+    """,
+}
+
+# One statement updates the counters of every member: +1 unread for the others,
+# the sender's cursor moves to the message it just sent
+RECORD_MESSAGE = """
+    INSERT INTO read_cursors (user_id, chat_type, chat_id, last_read_message_id, unread_count, last_message_at)
+    SELECT member_id, :chat_type, :chat_id,
+           CASE WHEN member_id = :sender_id THEN :message_id ELSE 0 END,
+           CASE WHEN member_id = :sender_id THEN 0 ELSE 1 END,
+           :timestamp
+    FROM ({members}) WHERE member_id IS NOT NULL
+    ON CONFLICT (user_id, chat_type, chat_id) DO UPDATE SET
+        last_read_message_id = CASE WHEN excluded.user_id = :sender_id
+                                    THEN :message_id ELSE read_cursors.last_read_message_id END,
+        unread_count = CASE WHEN excluded.user_id = :sender_id
+                            THEN 0 ELSE read_cursors.unread_count + 1 END,
+        last_message_at = excluded.last_message_at
+"""
+
+
+def record_message(db: Session, chat_type: str, chat_id: int, message_id: int, sender_id: int,
+                   timestamp: datetime):
+    """Update the read cursors of a chat for a new message, in the caller's transaction."""
+    statement = text(RECORD_MESSAGE.format(members=CHAT_MEMBERS[chat_type])).bindparams(
+        bindparam("timestamp", type_=DateTime)
+    )
+    db.execute(statement, {
+        "chat_type": chat_type,
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "sender_id": sender_id,
+        "timestamp": timestamp,
+    })
+
+
+def forget_chat(db: Session, user_ids: list, chat_type: str, chat_id: int):
+    """Drop the read cursors of users who left a chat, in the caller's transaction.
+
+    The cursor rows also list the chat in the users' inboxes, so they must
+    not outlive the membership.
+    """
+    db.execute(
+        delete(ReadCursor)
+        .where(ReadCursor.user_id.in_(user_ids), ReadCursor.chat_type == chat_type, ReadCursor.chat_id == chat_id)
+    )
+
+
+def mark_read(db: Session, user_id: int, chat_type: str, chat_id: int, message_id: int | None = None) -> ReadCursor:
+    """Move the user's read cursor forward to ``message_id`` (latest message by default)."""
+    model, chat_column = MESSAGE_MODELS[chat_type]
+    latest_id = db.query(func.max(model.id)).filter(chat_column == chat_id).scalar() or 0
+    if message_id is None or message_id > latest_id:
+        message_id = latest_id
+
+    cursor = db.query(ReadCursor).filter(
+        ReadCursor.user_id == user_id,
+        ReadCursor.chat_type == chat_type,
+        ReadCursor.chat_id == chat_id
+    ).first()
+    if not cursor:
+        cursor = ReadCursor(user_id=user_id, chat_type=chat_type, chat_id=chat_id, last_read_message_id=0)
+        db.add(cursor)
+    if message_id > cursor.last_read_message_id:
+        cursor.last_read_message_id = message_id
+    # Only the messages after the cursor are counted, which is what was unread
+    cursor.unread_count = (
+        db.query(func.count(model.id))
+        .filter(chat_column == chat_id, model.id > cursor.last_read_message_id)
+        .scalar()
+    )
+    db.commit()
+    return cursor
+
+
+def get_unread_counts(db: Session, user_id: int) -> list:
+    """Read state of every chat of the user, from the user's cursor rows only."""
+    rows = (
+        db.query(ReadCursor, GroupChat.name)
+        .outerjoin(GroupChat, (ReadCursor.chat_type == "group") & (GroupChat.id == ReadCursor.chat_id))
+        .filter(ReadCursor.user_id == user_id)
+        .all()
+    )
+    return [
+        {
+            "chat_type": cursor.chat_type,
+            "chat_id": cursor.chat_id,
+            "group_name": group_name,
+            "last_read_message_id": cursor.last_read_message_id,
+            "unread_count": cursor.unread_count,
+        }
+        for cursor, group_name in rows
+    ]
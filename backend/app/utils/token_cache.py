@@ -0,0 +1,57 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import TOKEN_CACHE_SIZE
+
+
+class VerifiedTokenCache:
+    """LRU of tokens whose signature was already checked, keyed by their SHA-256.
+
+    Entries are only served until the token's ``exp``; an expired token
+    falls through to a full decode, which then rejects it.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        # decode_token also runs in the threadpool of sync endpoints
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token) -> bytes:
+        return hashlib.sha256(token if isinstance(token, bytes) else token.encode()).digest()
+
+    def get(self, token) -> dict | None:
+        if not self.max_size:
+            return None
+        digest = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= time.time():
+                self._entries.pop(digest, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, token, payload: dict):
+        expires_at = payload.get("exp")
+        if not self.max_size or expires_at is None:
+            return
+        with self._lock:
+            self._entries[self.digest(token)] = (expires_at, dict(payload))
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
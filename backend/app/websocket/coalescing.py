@@ -0,0 +1,93 @@
+import asyncio
+
+from fastapi import WebSocket
+
+from app.config import (
+    WS_COALESCE_WINDOW_MS,
+    WS_COALESCE_MAX_MESSAGES,
+    WS_COALESCE_MAX_WINDOW_MS,
+    WS_COALESCE_MAX_BATCH
+)
+
+
+def negotiate_coalescing(options) -> dict | None:
+    """Turn the client's ``coalesce`` connect option into window settings.
+
+    ``true`` selects the server defaults, a dict may ask for a different
+    ``window_ms`` / ``max_messages`` within the server limits; missing keys,
+    as in ``{}``, keep the defaults. ``null`` / ``false`` turn coalescing off.
+    """
+    if options is None or options is False:
+        return None
+    window_ms = WS_COALESCE_WINDOW_MS
+    max_messages = WS_COALESCE_MAX_MESSAGES
+    if isinstance(options, dict):
+        window_ms = options.get("window_ms", window_ms)
+        max_messages = options.get("max_messages", max_messages)
+    try:
+        window_ms = min(max(float(window_ms), 0), WS_COALESCE_MAX_WINDOW_MS)
+        max_messages = min(max(int(max_messages), 1), WS_COALESCE_MAX_BATCH)
+    except (TypeError, ValueError):
+        return None
+    return {"window_ms": window_ms, "max_messages": max_messages}
+
+
+class FrameCoalescer:
+    """Buffer outbound messages of one WebSocket and send them as a single array frame.
+
+    Messages are pushed already JSON-encoded. The buffer is flushed when
+    ``max_messages`` are queued or ``window_ms`` after the first queued
+    message, whichever comes first.
+    """
+
+    def __init__(self, websocket: WebSocket, window_ms: float, max_messages: int):
+        self.websocket = websocket
+        self.window = window_ms / 1000
+        self.max_messages = max_messages
+        self.buffer: list = []
+        # Encoded bytes buffered or being written
+        self.pending_bytes = 0
+        self.frames_sent = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    async def push(self, message: str):
+        self.buffer.append(message)
+        self.pending_bytes += len(message)
+        if len(self.buffer) >= self.max_messages:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_later)
+
+    def _flush_later(self):
+        self._timer = None
+        self._flush_task = asyncio.create_task(self._safe_flush())
+
+    async def _safe_flush(self):
+        try:
+            await self.flush()
+        except Exception:
+            # Dead sockets are left to the heartbeat reaper
+            pass
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.buffer:
+            return
+        messages, self.buffer = self.buffer, []
+        frame = f"[{','.join(messages)}]"
+        self.frames_sent += 1
+        try:
+            await self.websocket.send_text(frame)
+        finally:
+            self.pending_bytes -= sum(len(message) for message in messages)
+
+    def close(self):
+        """Drop queued messages of a socket that is going away."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.buffer = []
+        self.pending_bytes = 0
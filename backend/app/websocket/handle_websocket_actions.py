@@ -1,25 +1,43 @@
 from sqlalchemy.orm import Session
 from starlette.websockets import WebSocket
 
-from app.models import User, GroupChat
+from app.models import User, GroupChat, PrivateChat
+from app.utils.message_archive import get_history
+from app.utils.message_search import search_messages
+from app.utils.attachments import attachment_metadata
+from app.utils.read_state import mark_read, get_unread_counts
+from app.websocket.heartbeat import HeartbeatReaper
 from app.websocket.manager import PrivateChatManager, GroupChatManager, ConnectionManager
+from app.websocket.presence import PresenceManager
+from app.websocket.recorder import TrafficRecorder
+from app.websocket.uploads import AttachmentUploadManager
 
 connection_manager = ConnectionManager()
 private_chat_manager = PrivateChatManager(connection_manager)
 group_chat_manager = GroupChatManager(connection_manager)
+heartbeat_reaper = HeartbeatReaper(connection_manager)
+presence_manager = PresenceManager(connection_manager)
+attachment_uploads = AttachmentUploadManager(connection_manager)
+traffic_recorder = TrafficRecorder()
 
 
 async def handle_websocket_action(websocket: WebSocket, message: dict, db: Session):
     action = message.get("action")
     data = message.get("data", {})
-    if action == "join_private_chat":
+    if action == "pong":
+        # Heartbeat reply, liveness is already recorded by the endpoint
+        return
+    elif action == "join_private_chat":
         await handle_join_private_chat(websocket, data, db)
     elif action == "send_private_message":
         chat_id = data.get("chat_id")
         message_data = data.get("message")
         if not chat_id or not message_data:
             await handle_join_private_chat(websocket, data, db)
-        await private_chat_manager.send_private_message(db, chat_id, message_data)
+        try:
+            await private_chat_manager.send_private_message(db, chat_id, message_data)
+        except ValueError as e:
+            await connection_manager.send_reply(websocket, f"Error sending message: {str(e)}")
     elif action == "create_group_chat":
         await handle_create_group_chat(websocket, data, db)
     elif action == "add_user_to_group_chat":
@@ -30,8 +48,31 @@ async def handle_websocket_action(websocket: WebSocket, message: dict, db: Sessi
         await handle_join_group_chat(websocket, data, db)
     elif action == "remove_user_from_group_chat":
         await handle_delete_user_from_chat(websocket, data, db)
+    elif action == "add_users_to_group_chat":
+        await handle_add_users_to_group_chat(websocket, data, db)
+    elif action == "remove_users_from_group_chat":
+        await handle_remove_users_from_group_chat(websocket, data, db)
+    elif action == "get_presence":
+        await handle_get_presence(websocket, data, db)
+    elif action == "get_history":
+        await handle_get_history(websocket, data, db)
+    elif action == "search_messages":
+        await handle_search_messages(websocket, data, db)
+    elif action == "begin_attachment_upload":
+        await attachment_uploads.begin(websocket, data)
+    elif action == "abort_attachment_upload":
+        await attachment_uploads.abort(websocket)
+    elif action == "mark_read":
+        await handle_mark_read(websocket, data, db)
+    elif action == "get_unread_counts":
+        await handle_get_unread_counts(websocket, data, db)
     else:
-        await websocket.send_text("Unknown action")
+        await connection_manager.send_reply(websocket, "Unknown action")
+
+    request_id = message.get("request_id")
+    if request_id is not None:
+        # Marks the end of the action for clients that need to match it, e.g. replay_traffic
+        await connection_manager.send_reply(websocket, {"type": "done", "request_id": request_id, "action": action})
 
 
 # Handlers for specific actions
@@ -43,25 +84,29 @@ async def handle_join_private_chat(websocket: WebSocket, data: dict, db: Session
     user1_id = user1.id
     user2_id = data.get("user2_id")
     if not user1_id or not user2_id:
-        await websocket.send_text("Missing user information for private chat")
+        await connection_manager.send_reply(websocket, "Missing user information for private chat")
         return
 
     # Get or create a private chat
     chat = await private_chat_manager.get_or_create_chat(db, user1_id, user2_id)
     # Add the user to the chat's WebSocket connections
-    await private_chat_manager.add_user_to_chat(chat.id, websocket)
+    if not await private_chat_manager.add_user_to_chat(chat.id, websocket):
+        return
     # Send chat history to the client
     messages = [
-        {"sender_username": db.query(User).filter(
+        {"id": message.id,
+         "sender_username": db.query(User).filter(
             User.id == message.sender_id
         ).first().username,
          "content": message.content,
-         "timestamp": message.timestamp.isoformat()
+         "timestamp": message.timestamp.isoformat(),
+         "attachment": attachment_metadata(message.attachment)
          }
         for message in chat.messages
     ]
     data_to_send = {"chat_id": chat.id, "history": messages}
-    await websocket.send_json(data_to_send)
+    await connection_manager.send_reply(websocket, data_to_send)
+    await send_presence_snapshot(websocket, chat.id, "private")
 
 
 async def handle_create_group_chat(websocket: WebSocket, data: dict, db: Session):
@@ -69,49 +114,57 @@ async def handle_create_group_chat(websocket: WebSocket, data: dict, db: Session
     group_name = data.get("group_name")
 
     if not admin_id or not group_name:
-        await websocket.send_text("Missing admin_id or group_name for creating group chat")
+        await connection_manager.send_reply(websocket, "Missing admin_id or group_name for creating group chat")
         return
 
     try:
         group_chat = await group_chat_manager.get_or_create_group_chat(admin_id, group_name, db)
-        await websocket.send_text(f"Group chat '{group_name}' created successfully with ID: {group_chat.id}")
+        await connection_manager.send_reply(
+            websocket, f"Group chat '{group_name}' created successfully with ID: {group_chat.id}"
+        )
     except ValueError as e:
-        await websocket.send_text(f"Error creating group chat: {str(e)}")
+        await connection_manager.send_reply(websocket, f"Error creating group chat: {str(e)}")
 
 
 async def handle_join_group_chat(websocket: WebSocket, data: dict, db: Session):
     user_name = data.get("user_name")
     group_name = data.get("group_name")
     user_id = db.query(User).filter(User.username == user_name).first().id
-    group_id = db.query(GroupChat).filter(GroupChat.name == group_name).first().id
+    group_id = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first().id
     if not user_id or not group_id:
-        await websocket.send_text("Missing user_id or group_id for joining group chat")
+        await connection_manager.send_reply(websocket, "Missing user_id or group_id for joining group chat")
         return
 
     # Fetch the group chat and check if the user is a member
     group_chat = db.query(GroupChat).filter(GroupChat.id == group_id).first()
     if not group_chat:
-        await websocket.send_text(f"Group chat with ID {group_id} does not exist.")
+        await connection_manager.send_reply(websocket, f"Group chat with ID {group_id} does not exist.")
         return
 
     # Check if the user is part of the group
     if not any(user.id == user_id for user in group_chat.users) and user_id != group_chat.admin_id:
-        await websocket.send_json({"content": f"User with ID {user_id} is not a member of the group."})
+        await connection_manager.send_reply(
+            websocket, {"content": f"User with ID {user_id} is not a member of the group."}
+        )
         return
     # Add the user to the group chat's WebSocket connections
-    await group_chat_manager.add_user_to_group(group_id, user_id, "joining", websocket, db)
+    if not await group_chat_manager.add_user_to_group(group_id, user_id, "joining", websocket, db):
+        return
 
     # Retrieve the message history of the group chat
     messages = [
-        {"sender_username": db.query(User).filter(User.id == message.sender_id).first().username,
+        {"id": message.id,
+         "sender_username": db.query(User).filter(User.id == message.sender_id).first().username,
          "content": message.content,
-         "timestamp": message.timestamp.isoformat()}
+         "timestamp": message.timestamp.isoformat(),
+         "attachment": attachment_metadata(message.attachment)}
         for message in group_chat.messages
     ]
 
     # Send the message history to the user
     data_to_send = {"group_id": group_id, "history": messages}
-    await websocket.send_json(data_to_send)
+    await connection_manager.send_reply(websocket, data_to_send)
+    await send_presence_snapshot(websocket, group_id, "group")
 
 
 async def handle_add_user_to_group_chat(websocket: WebSocket, data: dict, db: Session):
@@ -119,10 +172,12 @@ async def handle_add_user_to_group_chat(websocket: WebSocket, data: dict, db: Se
     user_id = data.get("user_id")
     adder_name = data.get("adder_name")  # The user who is trying to add another user
     user_name = db.query(User).filter(User.id == user_id).first().username
-    group_id = db.query(GroupChat).filter(GroupChat.name == group_name).first().id
+    group_id = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first().id
     adder_id = db.query(User).filter(User.username == adder_name).first().id
     if not group_id or not user_id or not adder_id:
-        await websocket.send_text("Missing group_id, user_id, or adder_id for adding user to group chat")
+        await connection_manager.send_reply(
+            websocket, "Missing group_id, user_id, or adder_id for adding user to group chat"
+        )
         return
 
     try:
@@ -134,7 +189,9 @@ async def handle_add_user_to_group_chat(websocket: WebSocket, data: dict, db: Se
 
         # Check if the adder is part of the group
         if not any(user.id == adder_id for user in group_chat.users) and adder_id != group_chat.admin_id:
-            await websocket.send_json({"content": "User is not in the group. You can not add another user to this group"})
+            await connection_manager.send_reply(
+                websocket, {"content": "User is not in the group. You can not add another user to this group"}
+            )
             return
             
         # Add the user to the group
@@ -145,7 +202,7 @@ async def handle_add_user_to_group_chat(websocket: WebSocket, data: dict, db: Se
                                                     f"I added {user_name}",
                                                     db)
     except ValueError as e:
-        await websocket.send_text(f"Error adding user to group chat: {str(e)}")
+        await connection_manager.send_reply(websocket, f"Error adding user to group chat: {str(e)}")
 
 
 async def handle_send_group_message(websocket: WebSocket, data: dict, db: Session):
@@ -153,15 +210,20 @@ async def handle_send_group_message(websocket: WebSocket, data: dict, db: Sessio
     message = data.get("message")
     sender_username = message.get("sender_username", None)
     content = message.get("content", None)
-    group = db.query(GroupChat).filter(GroupChat.name == group_name).first()
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
     sender_id = db.query(User).filter(User.username == sender_username).first().id
     if not any(user.id == sender_id for user in group.users) and sender_id != group.admin_id:
-        await websocket.send_json({"content": "User is not in the group. You can not send messages"})
+        await connection_manager.send_reply(
+            websocket, {"content": "User is not in the group. You can not send messages"}
+        )
         return
     if not group.id or not message:
-        await websocket.send_text("Missing group_id or message for group chat")
+        await connection_manager.send_reply(websocket, "Missing group_id or message for group chat")
         return
-    await group_chat_manager.send_group_message(group.id, sender_id, content, db)
+    try:
+        await group_chat_manager.send_group_message(group.id, sender_id, content, db, message.get("attachment_id"))
+    except ValueError as e:
+        await connection_manager.send_reply(websocket, f"Error sending message: {str(e)}")
 
 
 async def handle_delete_user_from_chat(websocket: WebSocket, data: dict, db: Session):
@@ -171,16 +233,16 @@ async def handle_delete_user_from_chat(websocket: WebSocket, data: dict, db: Ses
     group_name = data.get('group_name')
 
     admin = db.query(User).filter(User.username == admin_name).first()
-    group = db.query(GroupChat).filter(GroupChat.name == group_name).first()
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
     user = db.query(User).get(user_id)
     if user not in group.users:
-        await websocket.send_json({"content": "User is not in the group."})
+        await connection_manager.send_reply(websocket, {"content": "User is not in the group."})
         return
     if not group:
-        await websocket.send_json({"content": "There is no such group"})
+        await connection_manager.send_reply(websocket, {"content": "There is no such group"})
         return
     if not admin or admin.id != group.admin_id:
-        await websocket.send_json({"content": "You are not the admin, you cannot delete users."})
+        await connection_manager.send_reply(websocket, {"content": "You are not the admin, you cannot delete users."})
         return
 
     await group_chat_manager.delete_user_from_chat(admin_id=admin.id,
@@ -188,3 +250,189 @@ async def handle_delete_user_from_chat(websocket: WebSocket, data: dict, db: Ses
                                                    group_id=group.id,
                                                    db=db)
 
+
+async def handle_get_presence(websocket: WebSocket, data: dict, db: Session):
+    """Send who is online in a chat; only members may ask."""
+    user = await get_connection_user(websocket, db)
+    if not user:
+        return
+    chat = await resolve_member_chat(websocket, user, data, db)
+    if not chat:
+        return
+    chat_type, chat_id = chat
+    await send_presence_snapshot(websocket, chat_id, chat_type)
+
+
+async def send_presence_snapshot(websocket: WebSocket, chat_id: int, type_of_connection: str):
+    await connection_manager.send_reply(websocket, {
+        "type": "presence",
+        "chat_type": type_of_connection,
+        "chat_id": chat_id,
+        "online": presence_manager.get_online(chat_id, type_of_connection)
+    })
+
+
+async def get_connection_user(websocket: WebSocket, db: Session):
+    """The User authenticated on this WebSocket, or None after telling the client."""
+    user_info = connection_manager.get_user_info(websocket)
+    user = db.query(User).filter(User.username == user_info["username"]).first() if user_info else None
+    if not user:
+        await connection_manager.send_reply(websocket, {"content": "Not authenticated"})
+    return user
+
+
+async def resolve_member_chat(websocket: WebSocket, user: User, data: dict, db: Session):
+    """Resolve ``group_name`` or private ``chat_id`` to (chat_type, chat_id) if the user is a member."""
+    group_name = data.get("group_name")
+    chat_id = data.get("chat_id")
+    if group_name:
+        group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
+        if not group:
+            await connection_manager.send_reply(websocket, {"content": "There is no such group"})
+            return None
+        if not any(member.id == user.id for member in group.users) and user.id != group.admin_id:
+            await connection_manager.send_reply(websocket, {"content": "User is not in the group."})
+            return None
+        return "group", group.id
+    if chat_id:
+        chat = db.query(PrivateChat).filter(PrivateChat.id == chat_id).first()
+        if not chat or user.id not in (chat.user1_id, chat.user2_id):
+            await connection_manager.send_reply(websocket, {"content": "There is no such chat"})
+            return None
+        return "private", chat.id
+    await connection_manager.send_reply(websocket, "Missing group_name or chat_id")
+    return None
+
+
+async def handle_get_history(websocket: WebSocket, data: dict, db: Session):
+    """Send one page of history older than ``before_id``, reaching into the archive if needed."""
+    user = await get_connection_user(websocket, db)
+    if not user:
+        return
+    chat = await resolve_member_chat(websocket, user, data, db)
+    if not chat:
+        return
+    chat_type, chat_id = chat
+    before_id = data.get("before_id")
+    limit = min(max(int(data.get("limit", 50)), 1), 200)
+
+    messages = get_history(db, chat_type, chat_id, before_id, limit)
+    await connection_manager.send_reply(websocket, {
+        "type": "history",
+        "chat_type": chat_type,
+        "chat_id": chat_id,
+        "history": messages,
+        "next_before_id": messages[0]["id"] if len(messages) == limit else None
+    })
+
+
+async def handle_search_messages(websocket: WebSocket, data: dict, db: Session):
+    user = await get_connection_user(websocket, db)
+    if not user:
+        return
+    query = data.get("query", "")
+    limit = min(max(int(data.get("limit", 20)), 1), 100)
+
+    try:
+        page = search_messages(db, user.id, query, limit, data.get("cursor"))
+    except ValueError:
+        await connection_manager.send_reply(websocket, {"content": "Invalid cursor"})
+        return
+    await connection_manager.send_reply(websocket, {"type": "search_results", "query": query, **page})
+
+
+async def handle_mark_read(websocket: WebSocket, data: dict, db: Session):
+    """Move the caller's read cursor and send a read receipt to the chat."""
+    user = await get_connection_user(websocket, db)
+    if not user:
+        return
+    chat = await resolve_member_chat(websocket, user, data, db)
+    if not chat:
+        return
+    chat_type, chat_id = chat
+
+    cursor = mark_read(db, user.id, chat_type, chat_id, data.get("message_id"))
+    await connection_manager.send_reply(websocket, {
+        "type": "unread",
+        "chat_type": chat_type,
+        "chat_id": chat_id,
+        "last_read_message_id": cursor.last_read_message_id,
+        "unread_count": cursor.unread_count
+    })
+    await connection_manager.send_to_room(f"{chat_type}_{chat_id}", {
+        "type": "read_receipt",
+        "chat_type": chat_type,
+        "chat_id": chat_id,
+        "username": user.username,
+        "message_id": cursor.last_read_message_id
+    })
+
+
+async def handle_get_unread_counts(websocket: WebSocket, data: dict, db: Session):
+    user = await get_connection_user(websocket, db)
+    if not user:
+        return
+    await connection_manager.send_reply(websocket, {"type": "unread_counts", "chats": get_unread_counts(db, user.id)})
+
+
+def is_user_id_list(value) -> bool:
+    return (isinstance(value, list) and bool(value)
+            and all(isinstance(item, int) and not isinstance(item, bool) for item in value))
+
+
+async def handle_add_users_to_group_chat(websocket: WebSocket, data: dict, db: Session):
+    """Add every user in ``user_ids`` at once; the socket's user must be in the group."""
+    adder = await get_connection_user(websocket, db)
+    if not adder:
+        return
+    group_name = data.get("group_name")
+    user_ids = data.get("user_ids")
+    if not is_user_id_list(user_ids):
+        await connection_manager.send_reply(websocket, {"content": "user_ids must be a non-empty list of user ids"})
+        return
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
+    if not group:
+        await connection_manager.send_reply(websocket, {"content": "There is no such group"})
+        return
+    if not any(user.id == adder.id for user in group.users) and adder.id != group.admin_id:
+        await connection_manager.send_reply(
+            websocket, {"content": "User is not in the group. You can not add another user to this group"}
+        )
+        return
+
+    try:
+        added = await group_chat_manager.add_users_to_group(group.id, user_ids, adder.id, db)
+    except ValueError as e:
+        await connection_manager.send_reply(websocket, f"Error adding users to group chat: {str(e)}")
+        return
+    await connection_manager.send_reply(
+        websocket, {"type": "members_added", "group_name": group_name, "user_ids": [user.id for user in added]}
+    )
+
+
+async def handle_remove_users_from_group_chat(websocket: WebSocket, data: dict, db: Session):
+    """Remove every user in ``user_ids`` at once; only the group's admin, as the socket's user."""
+    admin = await get_connection_user(websocket, db)
+    if not admin:
+        return
+    group_name = data.get("group_name")
+    user_ids = data.get("user_ids")
+    if not is_user_id_list(user_ids):
+        await connection_manager.send_reply(websocket, {"content": "user_ids must be a non-empty list of user ids"})
+        return
+    group = db.query(GroupChat).filter(GroupChat.name == group_name, GroupChat.is_deleted.is_(False)).first()
+    if not group:
+        await connection_manager.send_reply(websocket, {"content": "There is no such group"})
+        return
+    if admin.id != group.admin_id:
+        await connection_manager.send_reply(websocket, {"content": "You are not the admin, you cannot delete users."})
+        return
+
+    try:
+        removed = await group_chat_manager.remove_users_from_group(group.id, user_ids, admin.id, db)
+    except ValueError as e:
+        await connection_manager.send_reply(websocket, f"Error removing users from group chat: {str(e)}")
+        return
+    await connection_manager.send_reply(
+        websocket, {"type": "members_removed", "group_name": group_name, "user_ids": [user.id for user in removed]}
+    )
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from fastapi import WebSocket
+
+from app.config import WS_PING_INTERVAL, WS_PING_TIMEOUT, WS_IDLE_TIMEOUT
+from app.websocket.manager import ConnectionManager
+
+
+class HeartbeatReaper:
+    """Ping every registered WebSocket and reap the ones that stopped answering.
+
+    Clients are expected to answer ``{"type": "ping"}`` with ``{"action": "pong"}``;
+    any inbound frame counts as a sign of life.
+    """
+
+    def __init__(self,
+                 connection_manager: ConnectionManager,
+                 ping_interval: float = WS_PING_INTERVAL,
+                 ping_timeout: float = WS_PING_TIMEOUT,
+                 idle_timeout: float = WS_IDLE_TIMEOUT):
+        self.connection_manager = connection_manager
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.idle_timeout = idle_timeout
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Heartbeat error: {str(e)}")
+
+    async def sweep(self):
+        """Ping the live connections and reap the dead or idle ones.
+
+        Reaped sockets are closed in the background: a half-open peer can hold
+        its close for ``close_timeout`` seconds, and waiting on each in turn
+        would delay the pings past ``ping_timeout``.
+        """
+        now = time.monotonic()
+        to_ping = []
+        for websocket in self.connection_manager.connected_websockets():
+            last_seen = self.connection_manager.last_seen.get(websocket, now)
+            last_active = self.connection_manager.last_active.get(websocket, now)
+            if now - last_seen > self.ping_timeout:
+                self.connection_manager.reap_later(websocket, "Heartbeat timeout")
+            elif self.idle_timeout and now - last_active > self.idle_timeout:
+                self.connection_manager.reap_later(websocket, "Idle timeout")
+            else:
+                to_ping.append(websocket)
+        await asyncio.gather(*(self._ping(websocket) for websocket in to_ping))
+
+    async def _ping(self, websocket: WebSocket):
+        try:
+            # A full send buffer means the peer stopped reading; do not let it stall the sweep
+            await asyncio.wait_for(websocket.send_json({"type": "ping"}), timeout=self.ping_interval)
+        except Exception:
+            self.connection_manager.reap_later(websocket, "Heartbeat failed")
@@ -1,28 +1,104 @@
+import asyncio
+import json
+import sys
+import time
 from typing import Dict, List
 from datetime import datetime
 from fastapi import WebSocket, HTTPException
+from sqlalchemy import delete, insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
 
-from app.models import PrivateChat, PrivateMessage, User, GroupChat, GroupMessage
+from app.config import (
+    MAX_CONNECTIONS,
+    MAX_CONNECTIONS_PER_USER,
+    MAX_ROOMS_PER_CONNECTION,
+    MAX_PENDING_OUTBOUND_BYTES,
+    WS_CONNECTION_BASE_BYTES
+)
+from app.models import PrivateChat, PrivateMessage, User, GroupChat, GroupMessage, Attachment, group_user_association
+from app.utils.attachments import attachment_metadata
+from app.utils.inbox import update_conversation_summary
+from app.utils.read_state import forget_chat, record_message
+from app.websocket.coalescing import FrameCoalescer, negotiate_coalescing
 from app.websocket.verify_websocket import verify_connection
 
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: dict = {}
-
-    async def connect(self, websocket: WebSocket, csrf_token: str, access_token: str):
-        """Connect a WebSocket and associate it with a CSRF token and access token."""
+        # Monotonic time of the last frame / last non-pong action per WebSocket
+        self.last_seen: dict = {}
+        self.last_active: dict = {}
+        self.reaped_connections = 0
+        # Chat codes each WebSocket is subscribed to, so disconnect does not scan every room
+        self.connection_rooms: dict = {}
+        # Set by PresenceManager when presence tracking is enabled
+        self.presence_manager = None
+        # WebSockets that negotiated outbound frame coalescing
+        self.coalescers: dict = {}
+        # Open connections per username, for the per-user cap
+        self.user_connections: dict = {}
+        # Bytes handed to sends that have not returned yet, per WebSocket
+        self.outbound_bytes: dict = {}
+        self.rejected_connections = 0
+        # Accepted sockets that have not authenticated yet, counted against MAX_CONNECTIONS
+        self.handshaking: set = set()
+        self._closing: set = set()
+
+    async def admit(self, websocket: WebSocket) -> bool:
+        """Reserve a connection slot for a socket that was just accepted.
+
+        Over ``MAX_CONNECTIONS`` the socket is closed with 1013 and False is
+        returned. The slot is released by ``connect`` or ``disconnect``.
+        """
+        if MAX_CONNECTIONS and len(self.last_seen) + len(self.handshaking) >= MAX_CONNECTIONS:
+            self.rejected_connections += 1
+            await websocket.close(code=1013, reason="Server is at its connection limit")
+            return False
+        self.handshaking.add(websocket)
+        return True
+
+    async def connect(self, websocket: WebSocket, csrf_token: str, access_token: str, coalesce=None):
+        """Connect a WebSocket and associate it with a CSRF token and access token.
+
+        ``coalesce`` is the client's opt-in for batching chat frames into arrays;
+        when it is given, the settings in effect are acknowledged with a
+        ``{"type": "coalescing"}`` frame, ``null`` values meaning coalescing is off.
+        Over the connection caps the socket is closed with 1013 (server full)
+        or 1008 (per-user limit) and not registered.
+        """
         try:
+            self.handshaking.discard(websocket)
+            # Checked before the token so a reconnect storm is turned away cheaply
+            if MAX_CONNECTIONS and len(self.last_seen) + len(self.handshaking) >= MAX_CONNECTIONS:
+                self.rejected_connections += 1
+                await websocket.close(code=1013, reason="Server is at its connection limit")
+                return
             username = await verify_connection(websocket, access_token)
             if not username:
                 raise HTTPException(status_code=401, detail="Invalid access token")
+            if MAX_CONNECTIONS_PER_USER and self.user_connections.get(username, 0) >= MAX_CONNECTIONS_PER_USER:
+                self.rejected_connections += 1
+                await websocket.close(code=1008, reason="Too many connections for this user")
+                return
             # Store the username and csrf_token with the WebSocket
             self.active_connections[websocket] = {
                 "username": username,
                 "csrf_token": csrf_token
             }
+            self.last_seen[websocket] = self.last_active[websocket] = time.monotonic()
+            self.user_connections[username] = self.user_connections.get(username, 0) + 1
+            settings = negotiate_coalescing(coalesce)
+            if settings:
+                self.coalescers[websocket] = FrameCoalescer(websocket, **settings)
+            if coalesce is not None:
+                # Sent directly so the acknowledgement is never itself batched
+                await websocket.send_json({
+                    "type": "coalescing",
+                    "window_ms": settings["window_ms"] if settings else None,
+                    "max_messages": settings["max_messages"] if settings else None
+                })
         except HTTPException as e:
             await websocket.close(code=1008, reason=f"Authentication failed: {e.detail}")
         except Exception as e:
@@ -30,11 +106,170 @@ class ConnectionManager:
 
     def disconnect(self, websocket: WebSocket):
         """Disconnect the WebSocket and remove it from active connections."""
-        websocket_to_delete = websocket
-        self.active_connections.pop(websocket_to_delete, None)
-        for key, values in self.active_connections.items():
-            if isinstance(values, list) and websocket_to_delete in values:
-                values.remove(websocket_to_delete)
+        self.handshaking.discard(websocket)
+        user_info = self.active_connections.pop(websocket, None)
+        if websocket in self.last_seen and user_info:
+            remaining = self.user_connections.get(user_info["username"], 1) - 1
+            if remaining > 0:
+                self.user_connections[user_info["username"]] = remaining
+            else:
+                self.user_connections.pop(user_info["username"], None)
+        self.last_seen.pop(websocket, None)
+        self.last_active.pop(websocket, None)
+        self.outbound_bytes.pop(websocket, None)
+        coalescer = self.coalescers.pop(websocket, None)
+        if coalescer:
+            coalescer.close()
+        for chat_code in self.connection_rooms.pop(websocket, set()):
+            connections = self.active_connections.get(chat_code, [])
+            if websocket in connections:
+                connections.remove(websocket)
+            if not connections:
+                self.active_connections.pop(chat_code, None)
+            if user_info and self.presence_manager:
+                self.presence_manager.user_unsubscribed(chat_code, user_info["username"])
+
+    def touch(self, websocket: WebSocket, active: bool = True):
+        """Record that a frame was received from the WebSocket."""
+        if websocket not in self.last_seen:
+            return
+        now = time.monotonic()
+        self.last_seen[websocket] = now
+        if active:
+            self.last_active[websocket] = now
+
+    def connected_websockets(self) -> list:
+        """Return the authenticated WebSockets currently registered."""
+        return list(self.last_seen)
+
+    async def reap(self, websocket: WebSocket, reason: str, close_timeout: float = 5, code: int = 1001):
+        """Close a dead or idle WebSocket and unregister it from every chat."""
+        self.disconnect(websocket)
+        self.reaped_connections += 1
+        try:
+            # A half-open peer never acknowledges the close frame, so do not wait on it forever
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), timeout=close_timeout)
+        except Exception:
+            pass
+
+    def reap_later(self, websocket: WebSocket, reason: str, code: int = 1001):
+        """Unregister now and close in the background, so the caller never waits on a half-open peer."""
+        self.disconnect(websocket)
+        task = asyncio.create_task(self.reap(websocket, reason, code=code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def pending_outbound_bytes(self, websocket: WebSocket) -> int:
+        """Bytes queued for a socket: buffered in its coalescer or in a send that has not returned."""
+        coalescer = self.coalescers.get(websocket)
+        return self.outbound_bytes.get(websocket, 0) + (coalescer.pending_bytes if coalescer else 0)
+
+    def connection_memory(self, websocket: WebSocket) -> int:
+        """Rough estimate of the bytes one connection holds in this process.
+
+        ``WS_CONNECTION_BASE_BYTES`` stands for the server stack (ASGI
+        protocol, buffers, DB session); the rest is the registry entries and
+        the pending outbound bytes of the socket.
+        """
+        user_info = self.active_connections.get(websocket) or {}
+        rooms = self.connection_rooms.get(websocket, set())
+        registry = sys.getsizeof(user_info) + sum(sys.getsizeof(value) for value in user_info.values())
+        # The room set plus one list slot per room
+        registry += sys.getsizeof(rooms) + 8 * len(rooms)
+        return WS_CONNECTION_BASE_BYTES + registry + self.pending_outbound_bytes(websocket)
+
+    def connection_stats(self, websocket: WebSocket) -> dict:
+        """Size gauges of one connection; who it belongs to is not exposed."""
+        return {
+            "rooms": len(self.connection_rooms.get(websocket, ())),
+            "pending_outbound_bytes": self.pending_outbound_bytes(websocket),
+            "estimated_memory_bytes": self.connection_memory(websocket),
+        }
+
+    def stats(self, top: int = 0) -> dict:
+        """Gauges describing the connection registry.
+
+        ``top`` adds the connections with the largest memory estimate.
+        """
+        rooms = {key: value for key, value in self.active_connections.items() if isinstance(value, list)}
+        memory = {websocket: self.connection_memory(websocket) for websocket in self.last_seen}
+        stats = {
+            "active_connections": len(self.last_seen),
+            "authenticating_connections": len(self.handshaking),
+            "connected_users": len(self.user_connections),
+            "rooms": len(rooms),
+            "room_subscriptions": sum(len(connections) for connections in rooms.values()),
+            "reaped_connections": self.reaped_connections,
+            "rejected_connections": self.rejected_connections,
+            "coalescing_connections": len(self.coalescers),
+            "pending_outbound_bytes": sum(self.pending_outbound_bytes(websocket) for websocket in self.last_seen),
+            "estimated_memory_bytes": sum(memory.values()),
+            "max_connection_memory_bytes": max(memory.values(), default=0),
+            "limits": {
+                "max_connections": MAX_CONNECTIONS,
+                "max_connections_per_user": MAX_CONNECTIONS_PER_USER,
+                "max_rooms_per_connection": MAX_ROOMS_PER_CONNECTION,
+                "max_pending_outbound_bytes": MAX_PENDING_OUTBOUND_BYTES,
+            },
+        }
+        if top:
+            largest = sorted(memory, key=memory.get, reverse=True)[:top]
+            stats["largest_connections"] = [self.connection_stats(websocket) for websocket in largest]
+        return stats
+
+    async def send_json(self, websocket: WebSocket, message: dict):
+        """Send a chat frame, through the socket's coalescer when it negotiated one.
+
+        A socket whose pending outbound bytes would pass
+        ``MAX_PENDING_OUTBOUND_BYTES`` is a consumer that cannot keep up: the
+        frame is dropped and the socket closed with 1008.
+        """
+        # Same encoding as WebSocket.send_json, done here to know the frame size
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        if self._over_backlog_limit(websocket, len(text)):
+            return
+        coalescer = self.coalescers.get(websocket)
+        if coalescer:
+            await coalescer.push(text)
+            return
+        await self._send_counted(websocket, text)
+
+    async def send_reply(self, websocket: WebSocket, message):
+        """Send a reply (a dict, or plain text) to one socket, never batched.
+
+        The socket's coalescer is flushed first, so a reply cannot overtake
+        chat frames buffered before it. Replies count toward
+        ``MAX_PENDING_OUTBOUND_BYTES`` like chat frames; history and search
+        pages are the largest frames a socket gets.
+        """
+        coalescer = self.coalescers.get(websocket)
+        if coalescer:
+            await coalescer.flush()
+        text = message if isinstance(message, str) else json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        if self._over_backlog_limit(websocket, len(text)):
+            return
+        await self._send_counted(websocket, text)
+
+    def _over_backlog_limit(self, websocket: WebSocket, size: int) -> bool:
+        """True, and the socket reaped with 1008, when ``size`` more bytes would pass the limit."""
+        if MAX_PENDING_OUTBOUND_BYTES and self.pending_outbound_bytes(websocket) + size > MAX_PENDING_OUTBOUND_BYTES:
+            if websocket in self.last_seen:
+                self.reap_later(websocket, "Outbound backlog limit exceeded", code=1008)
+            return True
+        return False
+
+    async def _send_counted(self, websocket: WebSocket, text: str):
+        """Send a text frame, counted in the socket's pending bytes until the send returns."""
+        if websocket not in self.last_seen:
+            # Unregistered sockets, e.g. refused ones, have no entry to count in
+            await websocket.send_text(text)
+            return
+        self.outbound_bytes[websocket] = self.outbound_bytes.get(websocket, 0) + len(text)
+        try:
+            await websocket.send_text(text)
+        finally:
+            if websocket in self.outbound_bytes:
+                self.outbound_bytes[websocket] -= len(text)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send a personal message to a specific WebSocket."""
@@ -50,27 +285,80 @@ class ConnectionManager:
             if f"private_{chat_id}" in self.active_connections:
                 message["timestamp"] = datetime.now().isoformat()
                 connections = self.active_connections[f"private_{chat_id}"]
-                for websocket in connections:
-                    await websocket.send_json(message)
+                # A slow consumer may be reaped mid-broadcast, iterate over a copy
+                for websocket in list(connections):
+                    await self.send_json(websocket, message)
         if type_of_connection == "group":
             if f"group_{chat_id}" in self.active_connections:
                 message["timestamp"] = datetime.now().isoformat()
                 connections = self.active_connections[f"group_{chat_id}"]
-                for websocket in connections:
-                    await websocket.send_json(message)
+                # A slow consumer may be reaped mid-broadcast, iterate over a copy
+                for websocket in list(connections):
+                    await self.send_json(websocket, message)
+
+    async def add_user_to_chat(self, chat_id: int, type_of_connection: str, websocket: WebSocket) -> bool:
+        """Add a WebSocket connection to a specific chat.
+
+        Returns False when the connection is already in ``MAX_ROOMS_PER_CONNECTION``
+        rooms; it is then closed with 1008.
+        """
+        if type_of_connection not in ("private", "group"):
+            return False
+        chat_code = f"{type_of_connection}_{chat_id}"
+        if websocket in self.active_connections.get(chat_code, []):
+            return True
+        rooms = self.connection_rooms.get(websocket, set())
+        if MAX_ROOMS_PER_CONNECTION and len(rooms) >= MAX_ROOMS_PER_CONNECTION:
+            self.rejected_connections += 1
+            await self.reap(websocket, "Too many rooms for this connection", code=1008)
+            return False
+        self.active_connections.setdefault(chat_code, []).append(websocket)
+        self.connection_rooms.setdefault(websocket, set()).add(chat_code)
+        user_info = self.get_user_info(websocket)
+        if user_info and self.presence_manager:
+            self.presence_manager.user_subscribed(chat_code, user_info["username"])
+        return True
+
+    async def remove_chat(self, chat_id: int, type_of_connection: str, message: dict | None = None):
+        """Unsubscribe every connection from a chat, optionally telling them why."""
+        chat_code = f"{type_of_connection}_{chat_id}"
+        connections = self.active_connections.pop(chat_code, [])
+        for websocket in connections:
+            self.connection_rooms.get(websocket, set()).discard(chat_code)
+            user_info = self.get_user_info(websocket)
+            if user_info and self.presence_manager:
+                self.presence_manager.user_unsubscribed(chat_code, user_info["username"])
+            if message is not None:
+                try:
+                    await self.send_json(websocket, message)
+                except Exception:
+                    pass
+
+    async def send_to_room(self, chat_code: str, message: dict):
+        """Send a frame to every connection of a room, skipping sockets that fail."""
+        for websocket in list(self.active_connections.get(chat_code, [])):
+            try:
+                await self.send_json(websocket, message)
+            except Exception:
+                # Dead sockets are left to the heartbeat reaper
+                pass
+
+
+def get_sender_attachment(db: Session, attachment_id: int | None, sender_id: int):
+    """Attachment referenced by a new message; only the uploader may send it."""
+    if attachment_id is None:
+        return None
+    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+    if not attachment or attachment.uploader_id != sender_id:
+        raise ValueError(f"Attachment with id {attachment_id} does not exist.")
+    return attachment
 
-    async def add_user_to_chat(self, chat_id: int, type_of_connection: str, websocket: WebSocket):
-        """Add a WebSocket connection to a specific chat."""
-        if type_of_connection == "private":
-            chat_code = f"private_{chat_id}"
-            if chat_code not in self.active_connections:
-                self.active_connections[chat_code] = []
-            self.active_connections[chat_code].append(websocket)
-        if type_of_connection == "group":
-            chat_code = f"group_{chat_id}"
-            if chat_code not in self.active_connections:
-                self.active_connections[chat_code] = []
-            self.active_connections[chat_code].append(websocket)
+
+def summarize_usernames(usernames: list, shown: int = 5) -> str:
+    """'a, b and c' or 'a, b, c, d, e and 495 others' for system messages."""
+    if len(usernames) <= shown:
+        return " and ".join([", ".join(usernames[:-1]), usernames[-1]]) if len(usernames) > 1 else usernames[0]
+    return f"{', '.join(usernames[:shown])} and {len(usernames) - shown} others"
 
 
 class PrivateChatManager:
@@ -78,25 +366,32 @@ class PrivateChatManager:
         self.connection_manager = connection_manager
         self.private_chats: Dict[str, List[WebSocket]] = {}
 
-    async def add_user_to_chat(self, chat_id: int, websocket):
+    async def add_user_to_chat(self, chat_id: int, websocket) -> bool:
         # Manage adding users to a specific chat (e.g., WebSocket connections)
-        await self.connection_manager.add_user_to_chat(chat_id, "private", websocket)
+        return await self.connection_manager.add_user_to_chat(chat_id, "private", websocket)
 
     async def send_private_message(self, db: Session, chat_id: int, message: dict):
         # Save the message in the database
         sender = db.query(User).filter(
             User.username == message["sender_username"]
         ).first()
+        attachment = get_sender_attachment(db, message.get("attachment_id"), sender.id)
         private_message = PrivateMessage(
             chat_id=chat_id,
             sender_id=sender.id,
             content=message["content"],
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            attachment_id=attachment.id if attachment else None
         )
         db.add(private_message)
+        db.flush()
+        record_message(db, "private", chat_id, private_message.id, sender.id, private_message.timestamp)
+        update_conversation_summary(db, "private", chat_id, private_message, sender.username)
         db.commit()
         db.refresh(private_message)
         # Forward the message to connected users
+        message["id"] = private_message.id
+        message["attachment"] = attachment_metadata(attachment)
         await self.connection_manager.send_message_to_chat(chat_id, "private", message)
 
     async def get_or_create_chat(self, db: Session, user1_id: int, user2_id: int):
@@ -132,7 +427,7 @@ class GroupChatManager:
         # Try to find an existing group chat
         group_chat = (
             db.query(GroupChat)
-            .filter(GroupChat.admin_id == admin_id, GroupChat.name == name)
+            .filter(GroupChat.admin_id == admin_id, GroupChat.name == name, GroupChat.is_deleted.is_(False))
             .options(joinedload(GroupChat.users), joinedload(GroupChat.messages))  # Preload relationships
             .first()
         )
@@ -153,10 +448,14 @@ class GroupChatManager:
 
         return new_group_chat
 
-    async def add_user_to_group(self, group_id: int, user_id: int, type_of_action: str, websocket: WebSocket, db: Session):
-        """Add a user to a group chat and persist the membership in the database."""
+    async def add_user_to_group(self, group_id: int, user_id: int, type_of_action: str, websocket: WebSocket,
+                                db: Session) -> bool:
+        """Add a user to a group chat and persist the membership in the database.
+
+        Returns False when joining was refused by the room limit.
+        """
         # Fetch the group from the database
-        group_chat = db.query(GroupChat).filter(GroupChat.id == group_id).first()
+        group_chat = db.query(GroupChat).filter(GroupChat.id == group_id, GroupChat.is_deleted.is_(False)).first()
         if not group_chat:
             raise ValueError(f"Group with id {group_id} does not exist.")
 
@@ -176,12 +475,14 @@ class GroupChatManager:
 
         # Add the user's WebSocket connection to the in-memory group structure
         if type_of_action == "joining":
-            await self.connection_manager.add_user_to_chat(group_id, "group", websocket)
+            return await self.connection_manager.add_user_to_chat(group_id, "group", websocket)
+        return True
 
-    async def send_group_message(self, group_id: int, sender_id: int, message_text: str, db: Session):
+    async def send_group_message(self, group_id: int, sender_id: int, message_text: str, db: Session,
+                                 attachment_id: int | None = None):
         """Send a message to a group chat, store it in the database, and broadcast it to group members."""
         # Fetch the group chat from the database
-        group_chat = db.query(GroupChat).filter(GroupChat.id == group_id).first()
+        group_chat = db.query(GroupChat).filter(GroupChat.id == group_id, GroupChat.is_deleted.is_(False)).first()
         if not group_chat:
             raise ValueError(f"Group with id {group_id} does not exist.")
 
@@ -189,6 +490,7 @@ class GroupChatManager:
         sender = db.query(User).filter(User.id == sender_id).first()
         if not sender:
             raise ValueError(f"Sender with id {sender_id} does not exist.")
+        attachment = get_sender_attachment(db, attachment_id, sender_id)
 
         # Persist the message in the database
         try:
@@ -196,9 +498,13 @@ class GroupChatManager:
                 group_id=group_id,
                 sender_id=sender_id,
                 content=message_text,
-                timestamp=datetime.now()
+                timestamp=datetime.now(),
+                attachment_id=attachment.id if attachment else None
             )
             db.add(new_message)
+            db.flush()
+            record_message(db, "group", group_id, new_message.id, sender_id, new_message.timestamp)
+            update_conversation_summary(db, "group", group_id, new_message, sender.username)
             db.commit()
             db.refresh(new_message)  # Refresh to get the newly created message's ID, etc.
         except IntegrityError:
@@ -207,8 +513,10 @@ class GroupChatManager:
 
         # Broadcast the message to all WebSocket connections in the group
         await self.connection_manager.send_message_to_chat(group_id, "group", {
+            "id": new_message.id,
             "sender_username": sender.username,
-            "content": message_text
+            "content": message_text,
+            "attachment": attachment_metadata(attachment)
         })
 
     async def delete_user_from_chat(self, admin_id: int, user_name: str, group_id: int, db: Session):
@@ -220,6 +528,7 @@ class GroupChatManager:
         # Remove user from group properly
         try:
             group.users.remove(user)  # FIXED removal logic
+            forget_chat(db, [user.id], "group", group_id)
             db.commit()
         except IntegrityError:
             db.rollback()
@@ -229,3 +538,83 @@ class GroupChatManager:
                                       f"I deleted {user.username} from group",
                                       db)
 
+    def _get_users(self, user_ids: list, db: Session) -> list:
+        """Fetch users in one query, failing if any id does not exist."""
+        positions = {user_id: position for position, user_id in enumerate(dict.fromkeys(user_ids))}
+        users = db.query(User).filter(User.id.in_(list(positions))).all()
+        missing = set(positions) - {user.id for user in users}
+        if missing:
+            raise ValueError(f"Users with ids {sorted(missing)} do not exist.")
+        return sorted(users, key=lambda user: positions[user.id])
+
+    async def add_users_to_group(self, group_id: int, user_ids: list, adder_id: int, db: Session) -> list:
+        """Add many users to a group in one transaction and announce them in one message.
+
+        Users that already are members are skipped. Returns the users that were added.
+        """
+        group_chat = db.query(GroupChat).filter(GroupChat.id == group_id, GroupChat.is_deleted.is_(False)).first()
+        if not group_chat:
+            raise ValueError(f"Group with id {group_id} does not exist.")
+        users = self._get_users(user_ids, db)
+
+        members = group_user_association.c
+        existing = {
+            user_id for (user_id,) in
+            db.query(members.user_id).filter(members.group_id == group_id,
+                                             members.user_id.in_([user.id for user in users]))
+        }
+        existing.add(group_chat.admin_id)
+        added = [user for user in users if user.id not in existing]
+        if not added:
+            return []
+        try:
+            db.execute(insert(group_user_association),
+                       [{"group_id": group_id, "user_id": user.id} for user in added])
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise ValueError(f"Failed to add users to group {group_id} due to a database error.")
+
+        await self.send_group_message(group_id,
+                                      adder_id,
+                                      f"I added {summarize_usernames([user.username for user in added])}",
+                                      db)
+        return added
+
+    async def remove_users_from_group(self, group_id: int, user_ids: list, admin_id: int, db: Session) -> list:
+        """Remove many users from a group in one transaction and announce it in one message.
+
+        Ids that are not members are skipped. Returns the users that were removed.
+        """
+        group_chat = db.query(GroupChat).filter(GroupChat.id == group_id, GroupChat.is_deleted.is_(False)).first()
+        if not group_chat:
+            raise ValueError(f"Group with id {group_id} does not exist.")
+        users = self._get_users(user_ids, db)
+
+        members = group_user_association.c
+        member_ids = {
+            user_id for (user_id,) in
+            db.query(members.user_id).filter(members.group_id == group_id,
+                                             members.user_id.in_([user.id for user in users]))
+        }
+        removed = [user for user in users if user.id in member_ids]
+        if not removed:
+            return []
+        try:
+            db.execute(
+                delete(group_user_association)
+                .where(members.group_id == group_id, members.user_id.in_([user.id for user in removed]))
+            )
+            forget_chat(db, [user.id for user in removed], "group", group_id)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise ValueError(f"Failed to remove users from group {group_id} due to a database error.")
+        # Relationship collections loaded before the bulk delete are stale now
+        db.expire(group_chat)
+
+        await self.send_group_message(group_id,
+                                      admin_id,
+                                      f"I deleted {summarize_usernames([user.username for user in removed])} from group",
+                                      db)
+        return removed
@@ -0,0 +1,89 @@
+import asyncio
+
+from app.config import PRESENCE_TICK
+from app.websocket.manager import ConnectionManager
+
+
+class PresenceManager:
+    """Track who is online in each room and push coalesced presence diffs.
+
+    Subscriptions are counted per username, so a user with several sockets in a
+    room is online until the last one leaves. Changes are collected per room and
+    sent once per tick as ``{"type": "presence", "joined": [...], "left": [...]}``;
+    a user who leaves and comes back within the same tick produces no frame.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager, tick: float = PRESENCE_TICK):
+        self.connection_manager = connection_manager
+        self.tick = tick
+        # chat_code -> {username: number of subscribed connections}
+        self.online: dict = {}
+        # chat_code -> {username: new state}, reset on every flush
+        self.pending: dict = {}
+        self._task: asyncio.Task | None = None
+        connection_manager.presence_manager = self
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Presence error: {str(e)}")
+
+    def user_subscribed(self, chat_code: str, username: str):
+        counts = self.online.setdefault(chat_code, {})
+        counts[username] = counts.get(username, 0) + 1
+        if counts[username] == 1:
+            self._mark(chat_code, username, True)
+
+    def user_unsubscribed(self, chat_code: str, username: str):
+        counts = self.online.get(chat_code)
+        if not counts or username not in counts:
+            return
+        counts[username] -= 1
+        if counts[username] == 0:
+            del counts[username]
+            if not counts:
+                del self.online[chat_code]
+            self._mark(chat_code, username, False)
+
+    def _mark(self, chat_code: str, username: str, online: bool):
+        changes = self.pending.setdefault(chat_code, {})
+        if changes.get(username, online) != online:
+            # Flipped back to the state members last saw
+            del changes[username]
+            if not changes:
+                del self.pending[chat_code]
+        else:
+            changes[username] = online
+
+    def get_online(self, chat_id: int, type_of_connection: str) -> list:
+        """Usernames currently online in a chat."""
+        return sorted(self.online.get(f"{type_of_connection}_{chat_id}", {}))
+
+    async def flush(self):
+        """Send one presence diff per changed room to the connections in that room."""
+        pending, self.pending = self.pending, {}
+        for chat_code, changes in pending.items():
+            type_of_connection, chat_id = chat_code.split("_", 1)
+            await self.connection_manager.send_to_room(chat_code, {
+                "type": "presence",
+                "chat_type": type_of_connection,
+                "chat_id": int(chat_id),
+                "joined": sorted(username for username, online in changes.items() if online),
+                "left": sorted(username for username, online in changes.items() if not online),
+            })
@@ -0,0 +1,89 @@
+import base64
+import gzip
+import itertools
+import json
+import time
+
+from fastapi import WebSocket
+
+from app.config import WS_RECORD_PATH
+
+# Never written to the traffic log; replay mints fresh tokens per username
+SCRUBBED_KEYS = {"access_token", "refresh_token", "csrf_token", "password", "hashed_password"}
+
+
+def scrub(value):
+    """Copy of a decoded frame without credentials, at any nesting level."""
+    if isinstance(value, dict):
+        return {key: scrub(item) for key, item in value.items() if key not in SCRUBBED_KEYS}
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+class TrafficRecorder:
+    """Opt-in capture of inbound /ws frames for later replay.
+
+    Every line of the gzipped log is a JSON array
+    ``[seconds_since_start, connection_id, kind, payload]`` where kind is
+    ``open`` (payload: username and the scrubbed connect frame), ``text``
+    (the scrubbed frame), ``binary`` (base64 payload) or ``close``.
+    Disabled when ``path`` is empty.
+    """
+
+    def __init__(self, path: str = WS_RECORD_PATH):
+        self.path = path
+        self.connection_ids: dict = {}
+        self._ids = itertools.count(1)
+        self._started = time.monotonic()
+        self._log = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _write(self, connection_id: int, kind: str, payload):
+        if self._log is None:
+            # Appending adds a new gzip member, which readers handle transparently
+            self._log = gzip.open(self.path, "at", encoding="utf-8")
+        record = [round(time.monotonic() - self._started, 6), connection_id, kind, payload]
+        self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def open(self, websocket: WebSocket, username: str, frame: dict):
+        if not self.enabled:
+            return
+        connection_id = next(self._ids)
+        self.connection_ids[websocket] = connection_id
+        self._write(connection_id, "open", {"username": username, "frame": scrub(frame)})
+
+    def record(self, websocket: WebSocket, frame: dict):
+        connection_id = self.connection_ids.get(websocket)
+        if connection_id is not None:
+            self._write(connection_id, "text", scrub(frame))
+
+    def record_bytes(self, websocket: WebSocket, chunk: bytes):
+        connection_id = self.connection_ids.get(websocket)
+        if connection_id is not None:
+            self._write(connection_id, "binary", base64.b64encode(chunk).decode("ascii"))
+
+    def close(self, websocket: WebSocket):
+        connection_id = self.connection_ids.pop(websocket, None)
+        if connection_id is not None:
+            self._write(connection_id, "close", None)
+            self._log.flush()
+
+    def shutdown(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def read_traffic(path: str):
+    """Yield the records of a traffic log in order."""
+    with gzip.open(path, "rt", encoding="utf-8") as log:
+        try:
+            for line in log:
+                yield json.loads(line)
+        except (EOFError, json.JSONDecodeError):
+            # The tail of a log whose server did not shut down cleanly
+            return
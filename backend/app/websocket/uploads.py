@@ -0,0 +1,139 @@
+import hashlib
+import os
+import uuid
+
+from fastapi import WebSocket
+from sqlalchemy.orm import Session
+
+from app.config import ATTACHMENT_MAX_BYTES, ATTACHMENT_CHUNK_BYTES
+from app.models import Attachment, User
+from app.utils.attachments import attachment_metadata, store_blob, upload_dir
+from app.websocket.manager import ConnectionManager
+
+
+class AttachmentUpload:
+    def __init__(self, filename: str, content_type: str, size: int):
+        self.upload_id = uuid.uuid4().hex
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.received = 0
+        self.sha256 = hashlib.sha256()
+        self.tmp_path = os.path.join(upload_dir(), self.upload_id)
+        self.file = open(self.tmp_path, "wb")
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class AttachmentUploadManager:
+    """Chunked binary attachment uploads, at most one in flight per WebSocket.
+
+    ``begin_attachment_upload`` declares the file, the client then sends the
+    content as binary frames of at most ``chunk_size`` bytes. Each chunk is
+    acknowledged, and the upload completes once the declared size arrived.
+    """
+
+    def __init__(self, connection_manager: ConnectionManager,
+                 max_bytes: int = ATTACHMENT_MAX_BYTES,
+                 chunk_bytes: int = ATTACHMENT_CHUNK_BYTES):
+        self.connection_manager = connection_manager
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.uploads: dict = {}
+
+    async def begin(self, websocket: WebSocket, data: dict):
+        if not self.connection_manager.get_user_info(websocket):
+            await self.connection_manager.send_reply(websocket, {"content": "Not authenticated"})
+            return
+        try:
+            size = int(data.get("size"))
+        except (TypeError, ValueError):
+            await self.connection_manager.send_reply(
+                websocket, {"type": "upload_error", "content": "Missing attachment size"}
+            )
+            return
+        if size <= 0 or size > self.max_bytes:
+            await self.connection_manager.send_reply(websocket, {
+                "type": "upload_error",
+                "content": f"Attachment size must be between 1 and {self.max_bytes} bytes"
+            })
+            return
+
+        self.discard(websocket)
+        upload = AttachmentUpload(
+            filename=os.path.basename(str(data.get("filename") or "attachment")),
+            content_type=data.get("content_type") or "application/octet-stream",
+            size=size
+        )
+        self.uploads[websocket] = upload
+        await self.connection_manager.send_reply(websocket, {
+            "type": "upload_ready",
+            "upload_id": upload.upload_id,
+            "chunk_size": self.chunk_bytes
+        })
+
+    async def receive_chunk(self, websocket: WebSocket, chunk: bytes, db: Session):
+        upload = self.uploads.get(websocket)
+        if not upload:
+            await self.connection_manager.send_reply(
+                websocket, {"type": "upload_error", "content": "No upload in progress"}
+            )
+            return
+        if len(chunk) > self.chunk_bytes or upload.received + len(chunk) > upload.size:
+            self.discard(websocket)
+            await self.connection_manager.send_reply(websocket, {
+                "type": "upload_error",
+                "upload_id": upload.upload_id,
+                "content": "Chunk exceeds the chunk size or the declared attachment size"
+            })
+            return
+
+        upload.file.write(chunk)
+        upload.sha256.update(chunk)
+        upload.received += len(chunk)
+        if upload.received < upload.size:
+            await self.connection_manager.send_reply(websocket, {
+                "type": "upload_progress",
+                "upload_id": upload.upload_id,
+                "received": upload.received
+            })
+            return
+        await self._complete(websocket, upload, db)
+
+    async def _complete(self, websocket: WebSocket, upload: AttachmentUpload, db: Session):
+        del self.uploads[websocket]
+        upload.file.close()
+        digest = upload.sha256.hexdigest()
+        store_blob(upload.tmp_path, digest)
+
+        uploader = db.query(User).filter(
+            User.username == self.connection_manager.get_user_info(websocket)["username"]
+        ).first()
+        attachment = Attachment(
+            sha256=digest,
+            size=upload.size,
+            content_type=upload.content_type,
+            filename=upload.filename,
+            uploader_id=uploader.id if uploader else None
+        )
+        db.add(attachment)
+        db.commit()
+        db.refresh(attachment)
+        await self.connection_manager.send_reply(websocket, {
+            "type": "upload_complete",
+            "upload_id": upload.upload_id,
+            "attachment": attachment_metadata(attachment)
+        })
+
+    async def abort(self, websocket: WebSocket):
+        self.discard(websocket)
+        await self.connection_manager.send_reply(websocket, {"type": "upload_aborted"})
+
+    def discard(self, websocket: WebSocket):
+        """Drop the unfinished upload of a WebSocket, if any."""
+        upload = self.uploads.pop(websocket, None)
+        if upload:
+            upload.discard()
@@ -0,0 +1,118 @@
+"""Frames/s and CPU of chat fan-out with outbound frame coalescing on and off.
+
+Every fake client writes real WebSocket frames (``websockets`` framing) to a
+socketpair drained by a background thread, so JSON encoding, framing and the
+send syscalls are all paid by the measured process.
+
+Run from the backend folder:
+
+    python -m benchmarks.frame_coalescing --clients 200 --rooms 20 --messages 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from websockets.frames import Frame, Opcode  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.websocket.manager import ConnectionManager  # noqa: E402
+
+
+class SocketPairWebSocket:
+    """Minimal stand-in for a server-side WebSocket that writes to a real socket."""
+
+    def __init__(self):
+        self.sock, self.peer = socket.socketpair()
+        self.frames = 0
+        self._reader = threading.Thread(target=self._drain, daemon=True)
+        self._reader.start()
+
+    def _drain(self):
+        while self.peer.recv(65536):
+            pass
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, separators=(",", ":")))
+
+    async def send_text(self, data: str):
+        self.sock.sendall(Frame(Opcode.TEXT, data.encode()).serialize(mask=False))
+        self.frames += 1
+
+    async def close(self, code=1000, reason=None):
+        self.sock.close()
+
+
+async def run(coalesce, args) -> dict:
+    manager = ConnectionManager()
+    websockets = []
+    for client in range(args.clients):
+        websocket = SocketPairWebSocket()
+        token = create_access_token({"sub": f"user{client}"})
+        await manager.connect(websocket, "csrf", token, coalesce)
+        for offset in range(args.rooms_per_client):
+            await manager.add_user_to_chat((client + offset) % args.rooms, "group", websocket)
+        websockets.append(websocket)
+
+    # Do not count the coalescing acknowledgement sent on connect
+    for websocket in websockets:
+        websocket.frames = 0
+    subscribers = [len(manager.active_connections.get(f"group_{room}", [])) for room in range(args.rooms)]
+    wall, cpu = time.perf_counter(), time.process_time()
+    for number in range(args.messages):
+        await manager.send_message_to_chat(number % args.rooms, "group", {
+            "sender_username": f"user{number % args.clients}",
+            "content": f"message {number} " + "x" * args.size
+        })
+        if number % args.burst == args.burst - 1:
+            # Let timers fire between bursts like a live event loop would
+            await asyncio.sleep(0.001)
+    for coalescer in list(manager.coalescers.values()):
+        await coalescer.flush()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    frames = sum(websocket.frames for websocket in websockets)
+    delivered = sum(subscribers[number % args.rooms] for number in range(args.messages))
+    for websocket in websockets:
+        await websocket.close()
+    return {
+        "mode": "on" if coalesce else "off",
+        "delivered": delivered,
+        "frames": frames,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "frames_per_s": frames / wall,
+        "messages_per_s": delivered / wall,
+        "cpu_us_per_message": cpu / delivered * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--rooms-per-client", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--burst", type=int, default=50, help="messages sent between event loop yields")
+    parser.add_argument("--size", type=int, default=64, help="extra payload bytes per message")
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-messages", type=int, default=32)
+    args = parser.parse_args()
+
+    coalesce = {"window_ms": args.window_ms, "max_messages": args.max_messages}
+    print(f"{'mode':<5}{'delivered':>11}{'frames':>10}{'wall s':>9}{'cpu s':>8}"
+          f"{'frames/s':>11}{'msgs/s':>11}{'cpu us/msg':>12}")
+    for options in (None, coalesce):
+        result = asyncio.run(run(options, args))
+        print(f"{result['mode']:<5}{result['delivered']:>11}{result['frames']:>10}"
+              f"{result['wall_s']:>9.2f}{result['cpu_s']:>8.2f}{result['frames_per_s']:>11.0f}"
+              f"{result['messages_per_s']:>11.0f}{result['cpu_us_per_message']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
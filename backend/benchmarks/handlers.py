@@ -0,0 +1,188 @@
+"""Per-action timings and query counts of handle_websocket_action, in process.
+
+Every action is driven through ``handle_websocket_action`` with fake
+WebSockets against a seeded temporary database, plus group broadcast fan-out
+at 10, 100 and 1000 subscribers and history builds at several history sizes.
+
+Run from the backend folder:
+
+    python -m benchmarks.handlers --rounds 50
+    python -m benchmarks.handlers --filter fanout
+
+``tests/test_benchmarks.py`` runs the same suite for one round under pytest.
+"""
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+# Attachment uploads write temporary files, keep them out of the working tree
+ATTACHMENTS_DIR = tempfile.mkdtemp(prefix="chat-harness-attachments-")
+os.environ["ATTACHMENTS_DIR"] = ATTACHMENTS_DIR
+
+from app.auth import create_access_token  # noqa: E402
+from app.websocket.handle_websocket_actions import connection_manager, handle_websocket_action  # noqa: E402
+from benchmarks.harness import Benchmark, FakeWebSocket, seeded_database  # noqa: E402
+
+FANOUT_SIZES = (10, 100, 1000)
+HISTORY_SIZES = (10, 100, 1000, 5000)
+
+
+async def connect(username: str, group_id: int | None = None) -> FakeWebSocket:
+    websocket = FakeWebSocket()
+    await connection_manager.connect(websocket, "csrf", create_access_token({"sub": username}))
+    if group_id is not None:
+        await connection_manager.add_user_to_chat(group_id, "group", websocket)
+    return websocket
+
+
+def action(websocket: FakeWebSocket, db, name: str, data: dict | None = None):
+    """Bind one action call for ``Benchmark.run``."""
+    message = {"action": name, "data": data or {}}
+
+    async def call():
+        await handle_websocket_action(websocket, message, db)
+    return call
+
+
+def run_actions(bench: Benchmark, seeded, db):
+    run = bench.loop.run_until_complete
+    group_id = seeded.group_ids["main"]
+    admin = run(connect("user1", group_id))
+    # Members to remove come from the seeded members, users to add from everyone else
+    members = itertools.count(2)
+    outsiders = itertools.count(seeded.group_members["main"] + 2)
+    new_groups = itertools.count(1)
+
+    def clear():
+        admin.sent.clear()
+        return ()
+
+    def one_user(counter, key, **data):
+        def setup():
+            admin.sent.clear()
+            return (action(admin, db, key, {**data, "user_id": next(counter)}),)
+        return setup
+
+    def many_users(counter, key, **data):
+        def setup():
+            admin.sent.clear()
+            return (action(admin, db, key, {**data, "user_ids": [next(counter) for _ in range(10)]}),)
+        return setup
+
+    def call(function):
+        return function()
+
+    bench.run("pong", action(admin, db, "pong"), clear)
+    bench.run("unknown action", action(admin, db, "no_such_action"), clear)
+    bench.run("join_private_chat", action(admin, db, "join_private_chat",
+                                          {"user1": {"username": "user1"}, "user2_id": 2}), clear)
+    bench.run("send_private_message", action(admin, db, "send_private_message", {
+        "chat_id": seeded.private_chat_id,
+        "message": {"sender_username": "user1", "content": "hello"}
+    }), clear)
+    bench.run("create_group_chat", call, lambda: (action(admin, db, "create_group_chat", {
+        "admin_id": 1, "group_name": f"new group {next(new_groups)}"
+    }),))
+    bench.run("add_user_to_group_chat", call,
+              one_user(outsiders, "add_user_to_group_chat", group_name="main", adder_name="user1"))
+    bench.run("add_users_to_group_chat (10)", call,
+              many_users(outsiders, "add_users_to_group_chat", group_name="main"))
+    bench.run("remove_user_from_group_chat", call,
+              one_user(members, "remove_user_from_group_chat", group_name="main", admin_name="user1"))
+    bench.run("remove_users_from_group_chat (10)", call,
+              many_users(members, "remove_users_from_group_chat", group_name="main"))
+    bench.run("send_group_message", action(admin, db, "send_group_message", {
+        "group_id": "main", "message": {"sender_username": "user1", "content": "hello"}
+    }), clear)
+    bench.run("join_group_chat", action(admin, db, "join_group_chat",
+                                        {"user_name": "user1", "group_name": "main"}), clear)
+    bench.run("get_presence", action(admin, db, "get_presence", {"group_name": "main"}), clear)
+    bench.run("get_history", action(admin, db, "get_history", {"group_name": "main", "limit": 50}), clear)
+    bench.run("search_messages", action(admin, db, "search_messages", {"query": "message"}), clear)
+    bench.run("mark_read", action(admin, db, "mark_read", {"group_name": "main"}), clear)
+    bench.run("get_unread_counts", action(admin, db, "get_unread_counts"), clear)
+    bench.run("begin_attachment_upload", action(admin, db, "begin_attachment_upload",
+                                                {"filename": "a.bin", "size": 1024}), clear)
+    bench.run("abort_attachment_upload", action(admin, db, "abort_attachment_upload"), clear)
+    connection_manager.disconnect(admin)
+
+
+def run_fanout(bench: Benchmark, seeded, db):
+    run = bench.loop.run_until_complete
+    for size in FANOUT_SIZES:
+        name = f"fanout{size}"
+        group_id = seeded.group_ids[name]
+        sender = run(connect("user1", group_id))
+        subscribers = [run(connect(f"user{user_id}", group_id)) for user_id in range(2, size + 2)]
+
+        def clear():
+            for websocket in subscribers:
+                websocket.sent.clear()
+            sender.sent.clear()
+            return ()
+
+        result = bench.run(f"send_group_message fanout {size}", action(sender, db, "send_group_message", {
+            "group_id": name, "message": {"sender_username": "user1", "content": "hello"}
+        }), clear)
+        assert result is None or all(websocket.sent for websocket in subscribers), "broadcast did not reach every subscriber"
+        for websocket in [sender, *subscribers]:
+            connection_manager.disconnect(websocket)
+
+
+def run_history(bench: Benchmark, seeded, db):
+    run = bench.loop.run_until_complete
+    for size in HISTORY_SIZES:
+        name = f"history{size}"
+        websocket = run(connect("user1"))
+
+        def clear():
+            websocket.sent.clear()
+            return ()
+
+        bench.run(f"join_group_chat history {size}", action(websocket, db, "join_group_chat", {
+            "user_name": "user1", "group_name": name
+        }), clear, rounds=min(bench.rounds, max(5, 20000 // size)))
+        bench.run(f"get_history history {size}", action(websocket, db, "get_history", {
+            "group_name": name, "limit": 50
+        }), clear)
+        connection_manager.disconnect(websocket)
+
+
+def run_suite(rounds: int = 30, warmup: int = 2, name_filter: str = "", seed: int = 1):
+    """Seed a database sized for ``rounds`` and print every benchmark matching ``name_filter``."""
+    # Each add/remove round takes up to 10 fresh users
+    churn = (rounds + warmup) * 11
+    groups = {"main": (churn + 20, 1000)}
+    groups.update({f"fanout{size}": (size, 0) for size in FANOUT_SIZES})
+    groups.update({f"history{size}": (5, size) for size in HISTORY_SIZES})
+    users = max(max(FANOUT_SIZES), churn + 20) + churn + 2
+
+    with seeded_database(users=users, groups=groups, seed=seed) as seeded:
+        db = seeded.session_factory()
+        bench = Benchmark(seeded.engine, rounds=rounds, warmup=warmup, name_filter=name_filter)
+        print(bench.header())
+        run_actions(bench, seeded, db)
+        run_fanout(bench, seeded, db)
+        run_history(bench, seeded, db)
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        run_suite(args.rounds, args.warmup, args.filter, args.seed)
+    finally:
+        shutil.rmtree(ATTACHMENTS_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""In-process harness for benchmarking WebSocket handlers without a server.
+
+``FakeWebSocket`` records what handlers send, ``seeded_database`` builds a
+temporary SQLite database with users, groups and messages, ``QueryCounter``
+counts the SQL statements an engine runs and ``Benchmark`` times async calls
+in rounds, reporting queries next to timings.
+"""
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from starlette.websockets import WebSocketState  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import (  # noqa: E402
+    User, GroupChat, GroupMessage, PrivateChat, PrivateMessage, group_user_association
+)
+from app.utils.message_search import create_search_index  # noqa: E402
+
+
+class FakeWebSocket:
+    """Server-side WebSocket stand-in that keeps every frame sent to it."""
+
+    def __init__(self):
+        self.sent: list = []
+        self.close_code = None
+        self.client_state = WebSocketState.CONNECTED
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send_json(self, data, mode: str = "text"):
+        self.sent.append(data)
+
+    async def send_text(self, data: str):
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.close_code = code
+        self.application_state = WebSocketState.DISCONNECTED
+
+    def decoded(self, start: int = 0) -> list:
+        """Frames sent from ``start`` on, JSON text frames decoded and plain text left as is."""
+        frames = []
+        for frame in self.sent[start:]:
+            try:
+                frames.append(json.loads(frame) if isinstance(frame, str) else frame)
+            except ValueError:
+                frames.append(frame)
+        return frames
+
+
+class SeededDatabase:
+    """Handles to a seeded temporary database; see ``seeded_database``."""
+
+    def __init__(self, engine, session_factory, group_ids: dict, group_members: dict, private_chat_id: int,
+                 users: int):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.group_ids = group_ids
+        self.group_members = group_members
+        self.private_chat_id = private_chat_id
+        self.users = users
+
+
+@contextmanager
+def seeded_database(users: int = 1200, groups: dict | None = None, private_messages: int = 100, seed: int = 1):
+    """Yield a ``SeededDatabase`` backed by a temporary SQLite file.
+
+    ``groups`` maps a group name to ``(members, messages)``. ``user1`` is the
+    admin of every group, members are ``user2`` upwards and messages are sent
+    by random members. ``user1`` and ``user2`` also share a private chat.
+    """
+    groups = groups or {"group": (10, 100)}
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp(prefix="chat-harness-")
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'harness.db')}",
+                           connect_args={"check_same_thread": False})
+    try:
+        Base.metadata.create_all(bind=engine)
+        create_search_index(engine)
+        started = datetime.now() - timedelta(days=1)
+        group_ids = {}
+        with engine.begin() as connection:
+            connection.execute(insert(User), [
+                {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+                 "hashed_password": ""}
+                for user_id in range(1, users + 1)
+            ])
+            message_id = 0
+            for group_id, (name, (members, messages)) in enumerate(groups.items(), start=1):
+                group_ids[name] = group_id
+                connection.execute(insert(GroupChat), [
+                    {"id": group_id, "name": name, "admin_id": 1, "is_deleted": False}
+                ])
+                member_ids = list(range(2, members + 2))
+                if member_ids:
+                    connection.execute(insert(group_user_association), [
+                        {"group_id": group_id, "user_id": user_id} for user_id in member_ids
+                    ])
+                if messages:
+                    connection.execute(insert(GroupMessage), [
+                        {"id": message_id + number, "group_id": group_id,
+                         "sender_id": rng.choice(member_ids or [1]),
+                         "content": f"message {number} in {name}",
+                         "timestamp": started + timedelta(seconds=number)}
+                        for number in range(1, messages + 1)
+                    ])
+                    message_id += messages
+            connection.execute(insert(PrivateChat), [{"id": 1, "user1_id": 1, "user2_id": 2}])
+            if private_messages:
+                connection.execute(insert(PrivateMessage), [
+                    {"id": number, "chat_id": 1, "sender_id": 1 + number % 2,
+                     "content": f"private message {number}",
+                     "timestamp": started + timedelta(seconds=number)}
+                    for number in range(1, private_messages + 1)
+                ])
+        yield SeededDatabase(
+            engine,
+            sessionmaker(autocommit=False, autoflush=False, bind=engine),
+            group_ids,
+            {name: members for name, (members, _) in groups.items()},
+            private_chat_id=1,
+            users=users,
+        )
+    finally:
+        engine.dispose()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class QueryCounter:
+    """Count statements executed on ``engine`` while the counter is active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+class Benchmark:
+    """Time async callables in rounds, pytest-benchmark style, with query counts.
+
+    ``setup`` runs untimed before each round and returns the arguments of the call.
+    """
+
+    def __init__(self, engine, rounds: int = 50, warmup: int = 2, name_filter: str = ""):
+        self.engine = engine
+        self.rounds = rounds
+        self.warmup = warmup
+        self.name_filter = name_filter
+        self.results: list = []
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def run(self, name: str, function, setup=None, rounds: int | None = None):
+        if self.name_filter not in name:
+            return None
+        rounds = rounds or self.rounds
+        samples = []
+        queries = []
+        for round_number in range(self.warmup + rounds):
+            args = setup() if setup else ()
+            with QueryCounter(self.engine) as counter:
+                start = time.perf_counter()
+                self.loop.run_until_complete(function(*args))
+                elapsed = time.perf_counter() - start
+            if round_number >= self.warmup:
+                samples.append(elapsed * 1000)
+                queries.append(counter.count)
+        result = {
+            "name": name,
+            "min_ms": min(samples),
+            "median_ms": statistics.median(samples),
+            "mean_ms": statistics.mean(samples),
+            "max_ms": max(samples),
+            "queries": statistics.median(queries),
+            "rounds": rounds,
+        }
+        self.results.append(result)
+        print(self.format(result), flush=True)
+        return result
+
+    @staticmethod
+    def header() -> str:
+        return (f"{'name':<40}{'min ms':>9}{'median ms':>11}{'mean ms':>9}{'max ms':>9}"
+                f"{'queries':>9}{'rounds':>8}")
+
+    @staticmethod
+    def format(result: dict) -> str:
+        return (f"{result['name']:<40}{result['min_ms']:>9.3f}{result['median_ms']:>11.3f}"
+                f"{result['mean_ms']:>9.3f}{result['max_ms']:>9.3f}{result['queries']:>9.0f}"
+                f"{result['rounds']:>8}")
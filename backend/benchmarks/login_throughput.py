@@ -0,0 +1,140 @@
+"""Logins/s per core through /login/, and decode_token with and without the token cache.
+
+Concurrent logins are sent in process through the ASGI app against a seeded
+temporary database, once with bcrypt in a thread pool (how sync endpoints ran
+it before) and once per process pool size. While they run, a probe request
+measures how responsive the event loop stays.
+
+The cost factor follows BCRYPT_ROUNDS. Run from the backend folder:
+
+    BCRYPT_ROUNDS=10 python -m benchmarks.login_throughput --logins 200 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from sqlalchemy import update  # noqa: E402
+
+from app.auth import create_access_token, decode_token, password_hasher, token_cache  # noqa: E402
+from app.config import BCRYPT_ROUNDS  # noqa: E402
+from app.database import get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User  # noqa: E402
+from app.utils.password_hashing import pwd_context  # noqa: E402
+from benchmarks.harness import seeded_database  # noqa: E402
+
+PASSWORD = "benchmark password"
+
+
+async def probe(client: httpx.AsyncClient, samples: list, stop: asyncio.Event):
+    """Time a cheap request every 10 ms."""
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user1'}).decode()}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/ws/stats", headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def storm(logins: int, concurrency: int, users: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses: dict = {}
+
+        async def login(number: int):
+            async with semaphore:
+                response = await client.post("/login/", json={
+                    "username": f"user{number % users + 1}", "password": PASSWORD
+                })
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        samples: list = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, samples, stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(login(number) for number in range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+    samples.sort()
+    return {
+        "elapsed": elapsed,
+        "statuses": statuses,
+        "probe_p50_ms": statistics.median(samples) if samples else 0.0,
+        "probe_p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0,
+    }
+
+
+def run_mode(label: str, executor, workers: int, args) -> None:
+    password_hasher.stop()
+    password_hasher.workers = workers
+    password_hasher.max_queue = args.logins
+    if executor is not None:
+        password_hasher._executor = executor
+    else:
+        password_hasher.start()
+    # Warm up the pool so process start-up is not measured
+    asyncio.run(storm(workers * 2, workers, args.users))
+    result = asyncio.run(storm(args.logins, args.concurrency, args.users))
+    cores = min(workers, os.cpu_count() or 1)
+    rate = args.logins / result["elapsed"]
+    print(f"{label:<10}{workers:>8}{rate:>11.1f}{rate / cores:>15.1f}"
+          f"{result['probe_p50_ms']:>11.2f}{result['probe_p99_ms']:>11.2f}   {result['statuses']}")
+    password_hasher.stop()
+
+
+def time_decode(token: bytes, repeat: int, cached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if not cached:
+            token_cache._entries.clear()
+        decode_token(token)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, os.cpu_count() or 1})),
+                        help="comma separated process pool sizes")
+    parser.add_argument("--decodes", type=int, default=20000)
+    args = parser.parse_args()
+
+    with seeded_database(users=args.users, groups={}) as seeded:
+        with seeded.engine.begin() as connection:
+            connection.execute(update(User).values(hashed_password=pwd_context.hash(PASSWORD)))
+
+        def override_get_db():
+            db = seeded.session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+        app.dependency_overrides[get_db] = override_get_db
+
+        print(f"bcrypt rounds {BCRYPT_ROUNDS}, {os.cpu_count()} cpu(s), {args.logins} logins, "
+              f"concurrency {args.concurrency}")
+        print(f"{'mode':<10}{'workers':>8}{'logins/s':>11}{'logins/s/core':>15}"
+              f"{'probe p50':>11}{'probe p99':>11}   statuses")
+        # 40 threads is the size of Starlette's default threadpool
+        run_mode("threads", ThreadPoolExecutor(max_workers=40), 40, args)
+        for workers in (int(value) for value in args.workers.split(",")):
+            run_mode("processes", None, workers, args)
+        app.dependency_overrides.clear()
+
+    token = create_access_token({"sub": "user1"})
+    print(f"decode_token: {time_decode(token, args.decodes, cached=False):.1f} us uncached, "
+          f"{time_decode(token, args.decodes, cached=True):.1f} us cached")
+
+
+if __name__ == "__main__":
+    main()
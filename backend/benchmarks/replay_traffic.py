@@ -0,0 +1,169 @@
+"""Replay a /ws traffic log recorded with WS_RECORD_PATH against a running server.
+
+Every recorded connection is re-opened as its original user with a freshly
+minted access token, so the server must share this process's SECRET_KEY and
+have the recorded users (e.g. run it on a copy of the recorded database).
+Frames are sent on the recorded schedule, divided by ``--speed``; ``--speed 0``
+sends each connection's frames back to back.
+
+Every replayed text frame carries a ``request_id`` that the server echoes in
+a ``done`` frame once the action is handled; latency is the time between the
+two, so broadcasts and presence frames arriving in between are not counted.
+Recorded pongs are dropped and live pings are answered instead.
+
+Run from the backend folder:
+
+    SECRET_KEY=... python -m benchmarks.replay_traffic traffic.jsonl.gz --url ws://localhost:8000/ws --speed 10
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import itertools
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import websockets  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.websocket.recorder import read_traffic  # noqa: E402
+
+
+class ReplayStats:
+    def __init__(self):
+        self.connections = 0
+        self.failed_connections = 0
+        self.sent = 0
+        self.received = 0
+        self.latencies: list = []
+        self.max_lag = 0.0
+
+
+def load_connections(path: str) -> dict:
+    """Group the records of a traffic log by connection id, keeping their order.
+
+    Timestamps are made relative to the first record so replay starts right away.
+    """
+    connections: dict = {}
+    first = None
+    for timestamp, connection_id, kind, payload in read_traffic(path):
+        if first is None:
+            first = timestamp
+        connections.setdefault(connection_id, []).append((timestamp - first, kind, payload))
+    return connections
+
+
+async def receive_frames(websocket, pending: dict, stats: ReplayStats):
+    async for raw in websocket:
+        now = time.perf_counter()
+        stats.received += 1
+        if not isinstance(raw, str):
+            continue
+        try:
+            frame = json.loads(raw)
+        except ValueError:
+            # Some errors are sent as plain text
+            continue
+        if not isinstance(frame, dict):
+            continue
+        if frame.get("type") == "ping":
+            await websocket.send(json.dumps({"action": "pong"}))
+        elif frame.get("type") == "done" and frame.get("request_id") in pending:
+            stats.latencies.append(now - pending.pop(frame["request_id"]))
+
+
+async def replay_connection(url: str, events: list, started: float, speed: float, drain: float,
+                            stats: ReplayStats):
+    opened_at = events[0][0]
+
+    async def wait_until(timestamp: float):
+        if not speed:
+            return
+        delay = started + timestamp / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            stats.max_lag = max(stats.max_lag, -delay)
+
+    await wait_until(opened_at)
+    _, kind, payload = events[0]
+    if kind != "open":
+        # The connection was already open when recording started
+        return
+    frame = dict(payload["frame"])
+    frame["access_token"] = create_access_token({"sub": payload["username"]}).decode()
+    frame["csrf_token"] = "replay"
+
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            stats.connections += 1
+            pending: dict = {}
+            receiver = asyncio.create_task(receive_frames(websocket, pending, stats))
+            request_ids = itertools.count(1)
+
+            async def send_request(frame: dict):
+                request_id = next(request_ids)
+                pending[request_id] = time.perf_counter()
+                await websocket.send(json.dumps({**frame, "request_id": request_id}))
+                stats.sent += 1
+
+            await send_request(frame)
+            for timestamp, kind, payload in events[1:]:
+                await wait_until(timestamp)
+                if kind == "close":
+                    break
+                if kind == "binary":
+                    # Upload chunks cannot carry a request id and are not timed
+                    await websocket.send(base64.b64decode(payload))
+                    stats.sent += 1
+                elif payload.get("action") != "pong":
+                    await send_request(payload)
+            # Wait for the replies still owed before closing
+            deadline = time.perf_counter() + drain
+            while pending and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+            receiver.cancel()
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        stats.failed_connections += 1
+        print(f"Replay connection error: {str(e)}")
+
+
+async def replay(path: str, url: str, speed: float, drain: float) -> tuple:
+    connections = load_connections(path)
+    stats = ReplayStats()
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        replay_connection(url, events, started, speed, drain, stats) for events in connections.values()
+    ))
+    return stats, time.perf_counter() - started
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", help="traffic log written by the server with WS_RECORD_PATH set")
+    parser.add_argument("--url", default="ws://localhost:8000/ws")
+    parser.add_argument("--speed", type=float, default=1.0, help="time acceleration, 0 for no delays")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for outstanding replies")
+    args = parser.parse_args()
+
+    stats, elapsed = asyncio.run(replay(args.log, args.url, args.speed, args.drain))
+    print(f"connections {stats.connections} (failed {stats.failed_connections}) in {elapsed:.2f}s")
+    print(f"sent {stats.sent} frames ({stats.sent / elapsed:.0f}/s), "
+          f"received {stats.received} frames ({stats.received / elapsed:.0f}/s)")
+    if stats.latencies:
+        latencies_ms = [latency * 1000 for latency in stats.latencies]
+        print(f"latency ms: p50 {statistics.median(latencies_ms):.2f}  p95 {percentile(latencies_ms, 0.95):.2f}  "
+              f"p99 {percentile(latencies_ms, 0.99):.2f}  max {max(latencies_ms):.2f}")
+    print(f"max schedule lag {stats.max_lag * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""FTS5 message search against a LIKE scan over the same messages.
+
+Seeds a temporary SQLite database with group messages, then times
+``search_messages`` and an equivalent ``content LIKE '%term%'`` query scoped to
+the same chats for a rare, a medium and a common term, plus the page after
+the first one. Search reads one ``SEARCH_RANK_WINDOW`` of the newest matches
+per page, so its cost stays flat as a term gets common; LIKE is only fast when
+the newest messages already hold ``limit`` hits, and scans everything for a
+rare term.
+
+Run from the backend folder:
+
+    python -m benchmarks.search_vs_like --messages 1000000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import User, GroupChat, GroupMessage, group_user_association  # noqa: E402
+from app.utils.message_search import create_search_index, search_messages, user_chat_ids  # noqa: E402
+
+
+def seed(engine, args):
+    rng = random.Random(args.seed)
+    vocabulary = [f"word{number}" for number in range(args.vocabulary)]
+    # Zipf-like weights: a few words are everywhere, most are rare
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(args.vocabulary)))
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+             "hashed_password": ""}
+            for user_id in range(1, args.users + 1)
+        ])
+        connection.execute(insert(GroupChat), [
+            {"id": group_id, "name": f"group{group_id}", "admin_id": 1, "is_deleted": False}
+            for group_id in range(1, args.groups + 1)
+        ])
+        connection.execute(insert(group_user_association), [
+            {"group_id": group_id, "user_id": user_id}
+            for user_id in range(2, args.users + 1)
+            for group_id in rng.sample(range(1, args.groups + 1), min(args.groups_per_user, args.groups))
+        ])
+        batch = []
+        for message_id in range(1, args.messages + 1):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(6, 16))
+            batch.append({"id": message_id, "group_id": rng.randint(1, args.groups),
+                          "sender_id": rng.randint(1, args.users), "content": " ".join(words)})
+            if len(batch) == 10000:
+                connection.execute(insert(GroupMessage), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(GroupMessage), batch)
+
+
+def timed(function, repeat) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--groups-per-user", type=int, default=10)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/search.db")
+        Base.metadata.create_all(bind=engine)
+        create_search_index(engine)
+        start = time.perf_counter()
+        seed(engine, args)
+        print(f"seeded {args.messages} messages (with FTS triggers) in {time.perf_counter() - start:.1f}s")
+
+        db = sessionmaker(bind=engine)()
+        user_id = 2
+        group_ids, _ = user_chat_ids(db, user_id)
+        scope = ",".join(map(str, group_ids))
+
+        def like(term):
+            return db.execute(text(f"""
+                SELECT id FROM group_messages
+                WHERE group_id IN ({scope}) AND content LIKE :pattern
+                ORDER BY id DESC LIMIT :limit
+            """), {"pattern": f"%{term}%", "limit": args.limit}).all()
+
+        print(f"{'term':<12}{'fts ms':>10}{'page 2 ms':>11}{'like ms':>10}{'fts hits':>10}{'like hits':>11}")
+        for term in ("word0", "word150", f"word{args.vocabulary - 1}"):
+            fts_ms = timed(lambda: search_messages(db, user_id, term, args.limit), args.repeat)
+            first_page = search_messages(db, user_id, term, args.limit)
+            next_cursor = first_page["next_cursor"]
+            page_ms = timed(lambda: search_messages(db, user_id, term, args.limit, next_cursor),
+                            args.repeat) if next_cursor else 0.0
+            like_ms = timed(lambda: like(f"{term} "), args.repeat)
+            like_hits = len(like(f"{term} "))
+            print(f"{term:<12}{fts_ms:>10.2f}{page_ms:>11.2f}{like_ms:>10.2f}"
+                  f"{len(first_page['results']):>10}{like_hits:>11}")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
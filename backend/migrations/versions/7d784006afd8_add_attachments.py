@@ -0,0 +1,63 @@
+"""Add attachments
+
+Revision ID: 7d784006afd8
+Revises: f53a1c1d554f
+Create Date: 2026-10-19 21:18:26.553017
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d784006afd8'
+down_revision: Union[str, None] = 'f53a1c1d554f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by create_all_tables() on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('attachments'):
+        op.create_table(
+            'attachments',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sha256', sa.String(), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('content_type', sa.String(), nullable=True),
+            sa.Column('filename', sa.String(), nullable=True),
+            sa.Column('uploader_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['uploader_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_attachments_id', 'attachments', ['id'], unique=False)
+        op.create_index('ix_attachments_sha256', 'attachments', ['sha256'], unique=False)
+    for table in ('group_messages', 'private_messages'):
+        if 'attachment_id' not in [column['name'] for column in inspector.get_columns(table)]:
+            # SQLite cannot add the foreign key constraint to an existing table
+            op.add_column(table, sa.Column('attachment_id', sa.Integer(), nullable=True))
+            op.create_index(f'ix_{table}_attachment_id', table, ['attachment_id'], unique=False)
+    if not inspector.has_table('archived_attachments'):
+        op.create_table(
+            'archived_attachments',
+            sa.Column('attachment_id', sa.Integer(), nullable=False),
+            sa.Column('chat_type', sa.String(), nullable=False),
+            sa.Column('chat_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['attachment_id'], ['attachments.id'], ),
+            sa.PrimaryKeyConstraint('attachment_id', 'chat_type', 'chat_id')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('archived_attachments')
+    for table in ('group_messages', 'private_messages'):
+        op.drop_index(f'ix_{table}_attachment_id', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('attachment_id')
+    op.drop_index('ix_attachments_sha256', table_name='attachments')
+    op.drop_index('ix_attachments_id', table_name='attachments')
+    op.drop_table('attachments')
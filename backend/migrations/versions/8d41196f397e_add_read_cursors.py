@@ -0,0 +1,40 @@
+"""Add read cursors
+
+Revision ID: 8d41196f397e
+Revises: e0801a52854d
+Create Date: 2026-10-19 20:31:07.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41196f397e'
+down_revision: Union[str, None] = 'e0801a52854d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by create_all_tables() on startup
+    if sa.inspect(op.get_bind()).has_table('read_cursors'):
+        return
+    op.create_table(
+        'read_cursors',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('chat_type', sa.String(), nullable=False),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'chat_type', 'chat_id')
+    )
+    op.create_index('ix_read_cursors_chat', 'read_cursors', ['chat_type', 'chat_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_read_cursors_chat', table_name='read_cursors')
+    op.drop_table('read_cursors')
@@ -0,0 +1,33 @@
+"""Add group soft delete
+
+Revision ID: 92457cf4a44d
+Revises: 4c427073e07e
+Create Date: 2026-10-19 19:40:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '92457cf4a44d'
+down_revision: Union[str, None] = '4c427073e07e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by create_all_tables() on startup
+    inspector = sa.inspect(op.get_bind())
+    if 'is_deleted' not in [column['name'] for column in inspector.get_columns('group_chats')]:
+        op.add_column('group_chats', sa.Column('is_deleted', sa.Boolean(), server_default=sa.false(), nullable=False))
+    if 'ix_group_messages_group_id' not in [index['name'] for index in inspector.get_indexes('group_messages')]:
+        op.create_index('ix_group_messages_group_id', 'group_messages', ['group_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_group_messages_group_id', table_name='group_messages')
+    with op.batch_alter_table('group_chats') as batch_op:
+        batch_op.drop_column('is_deleted')
@@ -0,0 +1,48 @@
+"""Add message archive segments
+
+Revision ID: e0801a52854d
+Revises: 92457cf4a44d
+Create Date: 2026-10-19 20:05:41.274930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0801a52854d'
+down_revision: Union[str, None] = '92457cf4a44d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by create_all_tables() on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('archive_segments'):
+        op.create_table(
+            'archive_segments',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('chat_type', sa.String(), nullable=False),
+            sa.Column('chat_id', sa.Integer(), nullable=False),
+            sa.Column('first_message_id', sa.Integer(), nullable=False),
+            sa.Column('last_message_id', sa.Integer(), nullable=False),
+            sa.Column('message_count', sa.Integer(), nullable=False),
+            sa.Column('path', sa.String(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_archive_segments_id', 'archive_segments', ['id'], unique=False)
+        op.create_index('ix_archive_segments_chat_last_id', 'archive_segments',
+                        ['chat_type', 'chat_id', 'last_message_id'], unique=False)
+    if 'ix_private_messages_chat_id' not in [index['name'] for index in inspector.get_indexes('private_messages')]:
+        op.create_index('ix_private_messages_chat_id', 'private_messages', ['chat_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_private_messages_chat_id', table_name='private_messages')
+    op.drop_index('ix_archive_segments_chat_last_id', table_name='archive_segments')
+    op.drop_index('ix_archive_segments_id', table_name='archive_segments')
+    op.drop_table('archive_segments')
@@ -0,0 +1,95 @@
+"""Add conversation summaries
+
+Revision ID: f53a1c1d554f
+Revises: 8d41196f397e
+Create Date: 2026-10-19 20:52:44.160385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f53a1c1d554f'
+down_revision: Union[str, None] = '8d41196f397e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# INBOX_PREVIEW_LENGTH at the time of this revision
+PREVIEW_LENGTH = 100
+
+# The last message of every chat that has one
+BACKFILL_SUMMARIES = [
+    """
+    INSERT OR IGNORE INTO conversation_summaries
+        (chat_type, chat_id, last_message_id, sender_username, preview, last_message_at)
+    SELECT 'group', m.group_id, m.id, u.username, substr(m.content, 1, :preview_length), m.timestamp
+    FROM group_messages m LEFT JOIN users u ON u.id = m.sender_id
+    WHERE m.id IN (SELECT max(id) FROM group_messages GROUP BY group_id)
+    """,
+    """
+    INSERT OR IGNORE INTO conversation_summaries
+        (chat_type, chat_id, last_message_id, sender_username, preview, last_message_at)
+    SELECT 'private', m.chat_id, m.id, u.username, substr(m.content, 1, :preview_length), m.timestamp
+    FROM private_messages m LEFT JOIN users u ON u.id = m.sender_id
+    WHERE m.id IN (SELECT max(id) FROM private_messages GROUP BY chat_id)
+    """,
+]
+
+# A cursor for every current member, with the existing history counted as read
+BACKFILL_CURSORS = """
+    INSERT OR IGNORE INTO read_cursors
+        (user_id, chat_type, chat_id, last_read_message_id, unread_count, last_message_at)
+    SELECT members.member_id, s.chat_type, s.chat_id, s.last_message_id, 0, s.last_message_at
+    FROM conversation_summaries s JOIN (
+        SELECT 'group' AS chat_type, group_id AS chat_id, user_id AS member_id FROM group_users
+        UNION SELECT 'group', id, admin_id FROM group_chats
+        UNION SELECT 'private', id, user1_id FROM private_chats
+        UNION SELECT 'private', id, user2_id FROM private_chats
+    ) members ON members.chat_type = s.chat_type AND members.chat_id = s.chat_id
+    WHERE members.member_id IS NOT NULL
+"""
+
+# Cursors that existed before this revision have no last_message_at yet
+BACKFILL_CURSOR_TIMES = """
+    UPDATE read_cursors SET last_message_at = (
+        SELECT s.last_message_at FROM conversation_summaries s
+        WHERE s.chat_type = read_cursors.chat_type AND s.chat_id = read_cursors.chat_id
+    )
+    WHERE last_message_at IS NULL
+"""
+
+
+def upgrade() -> None:
+    # Tables may already have been created by create_all_tables() on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('conversation_summaries'):
+        op.create_table(
+            'conversation_summaries',
+            sa.Column('chat_type', sa.String(), nullable=False),
+            sa.Column('chat_id', sa.Integer(), nullable=False),
+            sa.Column('last_message_id', sa.Integer(), nullable=False),
+            sa.Column('sender_username', sa.String(), nullable=True),
+            sa.Column('preview', sa.Text(), nullable=True),
+            sa.Column('last_message_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('chat_type', 'chat_id')
+        )
+    if 'last_message_at' not in [column['name'] for column in inspector.get_columns('read_cursors')]:
+        op.add_column('read_cursors', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    if 'ix_read_cursors_inbox' not in [index['name'] for index in inspector.get_indexes('read_cursors')]:
+        op.create_index('ix_read_cursors_inbox', 'read_cursors',
+                        ['user_id', 'last_message_at', 'chat_type', 'chat_id'], unique=False)
+
+    for statement in BACKFILL_SUMMARIES:
+        op.execute(sa.text(statement).bindparams(preview_length=PREVIEW_LENGTH))
+    op.execute(BACKFILL_CURSOR_TIMES)
+    op.execute(BACKFILL_CURSORS)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_read_cursors_inbox', table_name='read_cursors')
+    with op.batch_alter_table('read_cursors') as batch_op:
+        batch_op.drop_column('last_message_at')
+    op.drop_table('conversation_summaries')
@@ -0,0 +1,77 @@
+"""Fixtures driving handlers in process, built on ``benchmarks.harness``.
+
+Run from the backend folder:
+
+    python -m pytest
+"""
+import os
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "test")
+# Uploads and archive segments must not land in the working tree
+os.environ.setdefault("ATTACHMENTS_DIR", tempfile.mkdtemp(prefix="chat-test-attachments-"))
+os.environ.setdefault("ARCHIVE_DIR", tempfile.mkdtemp(prefix="chat-test-archive-"))
+
+import pytest  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.utils import group_purge, message_archive  # noqa: E402
+from app.websocket.handle_websocket_actions import connection_manager, handle_websocket_action  # noqa: E402
+from benchmarks.harness import FakeWebSocket, seeded_database  # noqa: E402
+
+# user1 administers both groups; user2 to user6 are members of "main", user2 to user4 of "other"
+MAIN_MEMBERS = 5
+MAIN_MESSAGES = 30
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def seeded(monkeypatch, tmp_path):
+    """A ``SeededDatabase`` that code opening its own sessions uses too."""
+    with seeded_database(users=20, groups={"main": (MAIN_MEMBERS, MAIN_MESSAGES), "other": (3, 5)},
+                         private_messages=10) as seeded:
+        monkeypatch.setattr(message_archive, "SessionLocal", seeded.session_factory)
+        monkeypatch.setattr(group_purge, "SessionLocal", seeded.session_factory)
+        monkeypatch.setattr(message_archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+        yield seeded
+
+
+@pytest.fixture
+def db(seeded):
+    session = seeded.session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def connect():
+    """``await connect(username, group_id=None)``, a registered ``FakeWebSocket``.
+
+    Every socket still registered is disconnected after the test, so the
+    module-level connection manager starts empty each time.
+    """
+    async def connect(username: str, group_id: int | None = None, coalesce=None) -> FakeWebSocket:
+        websocket = FakeWebSocket()
+        await connection_manager.connect(websocket, "csrf", create_access_token({"sub": username}), coalesce)
+        if group_id is not None:
+            await connection_manager.add_user_to_chat(group_id, "group", websocket)
+        return websocket
+
+    yield connect
+    for websocket in connection_manager.connected_websockets():
+        connection_manager.disconnect(websocket)
+
+
+@pytest.fixture
+def action(db):
+    """``await action(websocket, name, data)``, the frames the action sent to that socket."""
+    async def action(websocket: FakeWebSocket, name: str, data: dict | None = None) -> list:
+        sent = len(websocket.sent)
+        await handle_websocket_action(websocket, {"action": name, "data": data or {}}, db)
+        db.close()
+        return websocket.decoded(sent)
+    return action
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.websocket import manager
+from app.websocket.handle_websocket_actions import connection_manager
+from benchmarks.harness import FakeWebSocket
+
+
+@pytest.mark.anyio
+async def test_server_cap_closes_with_1013(seeded, monkeypatch, connect):
+    monkeypatch.setattr(manager, "MAX_CONNECTIONS", 2)
+    rejected = connection_manager.rejected_connections
+    first, second, third = [await connect(f"user{number}") for number in (1, 2, 3)]
+    assert first.close_code is None and second.close_code is None
+    assert third.close_code == 1013
+    assert connection_manager.get_user_info(third) is None
+    assert connection_manager.rejected_connections == rejected + 1
+
+    # A freed slot can be taken again
+    connection_manager.disconnect(first)
+    assert (await connect("user3")).close_code is None
+
+
+@pytest.mark.anyio
+async def test_per_user_cap_closes_with_1008(seeded, monkeypatch, connect):
+    monkeypatch.setattr(manager, "MAX_CONNECTIONS_PER_USER", 2)
+    sockets = [await connect("user2") for _ in range(3)]
+    assert [websocket.close_code for websocket in sockets] == [None, None, 1008]
+    assert (await connect("user3")).close_code is None
+    assert connection_manager.stats()["connected_users"] == 2
+
+
+@pytest.mark.anyio
+async def test_room_cap_reaps_the_connection(seeded, monkeypatch, connect):
+    monkeypatch.setattr(manager, "MAX_ROOMS_PER_CONNECTION", 2)
+    websocket = await connect("user1")
+    assert await connection_manager.add_user_to_chat(1, "group", websocket)
+    assert await connection_manager.add_user_to_chat(2, "group", websocket)
+    # Joining a room it is already in does not count
+    assert await connection_manager.add_user_to_chat(2, "group", websocket)
+    assert not await connection_manager.add_user_to_chat(1, "private", websocket)
+    assert websocket.close_code == 1008
+    assert websocket not in connection_manager.connected_websockets()
+    assert connection_manager.stats()["room_subscriptions"] == 0
+
+
+@pytest.mark.anyio
+async def test_invalid_token_is_refused(seeded):
+    websocket = FakeWebSocket()
+    await connection_manager.connect(websocket, "csrf", "not a token")
+    assert websocket.close_code == 1008
+    assert connection_manager.get_user_info(websocket) is None
+
+
+class SilentWebSocket(FakeWebSocket):
+    """A client that completes the handshake and never authenticates."""
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self) -> str:
+        await asyncio.Event().wait()
+
+
+@pytest.mark.anyio
+async def test_sockets_still_authenticating_count_toward_the_cap(seeded, monkeypatch, connect):
+    monkeypatch.setattr(manager, "MAX_CONNECTIONS", 2)
+    pending = FakeWebSocket()
+    assert await connection_manager.admit(pending)
+    assert connection_manager.stats()["authenticating_connections"] == 1
+    assert (await connect("user1")).close_code is None
+    assert (await connect("user2")).close_code == 1013
+    refused = FakeWebSocket()
+    assert not await connection_manager.admit(refused)
+    assert refused.close_code == 1013
+
+    connection_manager.disconnect(pending)
+    assert connection_manager.stats()["authenticating_connections"] == 0
+    assert (await connect("user2")).close_code is None
+
+
+@pytest.mark.anyio
+async def test_silent_sockets_are_closed_after_the_auth_timeout(seeded, monkeypatch):
+    monkeypatch.setattr(main, "WS_AUTH_TIMEOUT", 0.05)
+    websocket = SilentWebSocket()
+    await main.websocket_endpoint(websocket, db=None)
+    assert websocket.close_code == 1008
+    assert connection_manager.stats()["authenticating_connections"] == 0
+
+
+@pytest.mark.anyio
+async def test_replies_count_toward_the_outbound_limit(seeded, monkeypatch, connect, action):
+    member = await connect("user2")
+    frames = await action(member, "get_history", {"group_name": "main", "limit": 30})
+    assert len(frames) == 1 and connection_manager.pending_outbound_bytes(member) == 0
+
+    # A history page bigger than the whole backlog allowance closes the socket
+    monkeypatch.setattr(manager, "MAX_PENDING_OUTBOUND_BYTES", len(member.sent[-1]) - 1)
+    assert await action(member, "get_history", {"group_name": "main", "limit": 30}) == []
+    assert member not in connection_manager.connected_websockets()
+    await asyncio.sleep(0.01)
+    assert member.close_code == 1008
@@ -0,0 +1,123 @@
+import os
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.auth import create_access_token
+from app.database import get_db
+from app.models import Attachment
+from app.utils.attachments import blob_path, can_read_attachment, upload_dir
+from app.utils.message_archive import archive_batch
+from app.websocket.handle_websocket_actions import connection_manager
+from app.websocket.uploads import AttachmentUploadManager
+
+CONTENT = b"0123456789"
+
+
+async def upload(uploads: AttachmentUploadManager, websocket, db, content: bytes = CONTENT) -> list:
+    await uploads.begin(websocket, {"filename": "../notes.txt", "content_type": "text/plain", "size": len(content)})
+    for start in range(0, len(content), uploads.chunk_bytes):
+        await uploads.receive_chunk(websocket, content[start:start + uploads.chunk_bytes], db)
+    return websocket.decoded()
+
+
+@pytest.fixture
+def client(seeded):
+    def seeded_db():
+        db = seeded.session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[get_db] = seeded_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.pop(get_db, None)
+
+
+def bearer(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username}).decode()}"}
+
+
+@pytest.mark.anyio
+async def test_chunks_are_acknowledged_until_the_upload_completes(seeded, db, connect):
+    uploads = AttachmentUploadManager(connection_manager, max_bytes=100, chunk_bytes=4)
+    websocket = await connect("user2")
+
+    ready, first, second, complete = await upload(uploads, websocket, db)
+
+    assert (ready["type"], ready["chunk_size"]) == ("upload_ready", 4)
+    assert [(first["type"], first["received"]), (second["type"], second["received"])] == [
+        ("upload_progress", 4), ("upload_progress", 8)
+    ]
+    assert complete["type"] == "upload_complete"
+    assert complete["attachment"]["filename"] == "notes.txt"
+    attachment = db.query(Attachment).filter(Attachment.id == complete["attachment"]["id"]).one()
+    with open(blob_path(attachment.sha256), "rb") as blob:
+        assert blob.read() == CONTENT
+    assert uploads.uploads == {}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("chunks", [[b"12345"], [b"1234", b"1234", b"123"]])
+async def test_chunks_past_the_limits_abort_the_upload(seeded, db, connect, chunks):
+    uploads = AttachmentUploadManager(connection_manager, max_bytes=100, chunk_bytes=4)
+    websocket = await connect("user2")
+    await uploads.begin(websocket, {"size": 10})
+    tmp_path = uploads.uploads[websocket].tmp_path
+
+    for chunk in chunks:
+        await uploads.receive_chunk(websocket, chunk, db)
+
+    assert websocket.decoded()[-1]["type"] == "upload_error"
+    assert uploads.uploads == {} and not os.path.exists(tmp_path)
+    assert db.query(Attachment).count() == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("size", [0, 101, None, "big"])
+async def test_declared_size_must_fit_the_limit(seeded, connect, size):
+    uploads = AttachmentUploadManager(connection_manager, max_bytes=100, chunk_bytes=4)
+    websocket = await connect("user2")
+    pending = os.listdir(upload_dir())
+    await uploads.begin(websocket, {"size": size})
+    assert [frame["type"] for frame in websocket.decoded()] == ["upload_error"]
+    assert uploads.uploads == {}
+    assert os.listdir(upload_dir()) == pending
+
+
+@pytest.mark.anyio
+async def test_only_members_of_a_chat_it_was_sent_in_may_download(seeded, db, connect, action, client):
+    uploads = AttachmentUploadManager(connection_manager, chunk_bytes=4)
+    sender = await connect("user2")
+    attachment_id = (await upload(uploads, sender, db))[-1]["attachment"]["id"]
+    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).one()
+    # Until it is sent only the uploader may read it
+    assert can_read_attachment(db, 2, attachment) and not can_read_attachment(db, 3, attachment)
+
+    await action(sender, "send_group_message", {
+        "group_id": "main",
+        "message": {"sender_username": "user2", "content": "file", "attachment_id": attachment_id}
+    })
+    assert client.get(f"/attachments/{attachment_id}", headers=bearer("user3")).content == CONTENT
+    assert client.get(f"/attachments/{attachment_id}", headers=bearer("user15")).status_code == 404
+
+    # Archiving the message keeps the file readable for the chat's members
+    while archive_batch(db, "group", datetime.now(), batch_size=100):
+        pass
+    assert client.get(f"/attachments/{attachment_id}", headers=bearer("user3")).status_code == 200
+    assert client.get(f"/attachments/{attachment_id}", headers=bearer("user15")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_downloads_answer_range_requests(seeded, db, connect, client):
+    uploads = AttachmentUploadManager(connection_manager, chunk_bytes=4)
+    attachment_id = (await upload(uploads, await connect("user2"), db))[-1]["attachment"]["id"]
+
+    response = client.get(f"/attachments/{attachment_id}", headers={**bearer("user2"), "Range": "bytes=2-5"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[2:6]
+    assert response.headers["content-range"] == f"bytes 2-5/{len(CONTENT)}"
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils import token_cache
+from app.utils.password_hashing import PasswordHashPool, pwd_context
+from app.utils.token_cache import VerifiedTokenCache
+
+
+def test_cached_tokens_are_served_until_they_expire(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(token_cache.time, "time", lambda: now)
+    cache = VerifiedTokenCache(max_size=10)
+    cache.put("token", {"sub": "user1", "exp": now + 60})
+    assert cache.get("token") == {"sub": "user1", "exp": now + 60}
+
+    now += 60
+    assert cache.get("token") is None
+    assert cache.get("token") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.stats()["size"] == 0
+
+
+def test_the_least_recently_used_token_is_evicted():
+    cache = VerifiedTokenCache(max_size=2)
+    for token in ("a", "b"):
+        cache.put(token, {"sub": token, "exp": 2 ** 40})
+    assert cache.get("a")
+    cache.put("c", {"sub": "c", "exp": 2 ** 40})
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+
+
+def test_tokens_without_expiry_are_not_cached():
+    cache = VerifiedTokenCache(max_size=2)
+    cache.put("token", {"sub": "user1"})
+    assert cache.get("token") is None
+
+
+@pytest.mark.anyio
+async def test_hashing_past_the_queue_limit_is_refused_with_503():
+    pool = PasswordHashPool(workers=1, max_queue=1)
+    try:
+        first = asyncio.create_task(pool.hash("secret"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as refused:
+            await pool.verify("secret", "")
+        assert refused.value.status_code == 503
+        assert refused.value.headers == {"Retry-After": "1"}
+        assert pwd_context.verify("secret", await first)
+        assert pool.stats()["rejected"] == 1 and pool.stats()["in_flight"] == 0
+    finally:
+        pool.stop()
@@ -0,0 +1,14 @@
+import shutil
+
+from benchmarks import handlers
+
+
+def test_handler_benchmarks_run(capsys):
+    """One round of benchmarks.handlers, so the suite keeps working as handlers change."""
+    try:
+        handlers.run_suite(rounds=1, warmup=0)
+    finally:
+        shutil.rmtree(handlers.ATTACHMENTS_DIR, ignore_errors=True)
+    output = capsys.readouterr().out
+    for name in ("remove_users_from_group_chat (10)", "send_group_message fanout 1000", "get_history history 5000"):
+        assert name in output
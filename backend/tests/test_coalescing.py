@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config import WS_COALESCE_MAX_MESSAGES, WS_COALESCE_MAX_WINDOW_MS, WS_COALESCE_WINDOW_MS
+from app.websocket.coalescing import FrameCoalescer, negotiate_coalescing
+from app.websocket.handle_websocket_actions import handle_websocket_action
+from benchmarks.harness import FakeWebSocket
+
+DEFAULTS = {"window_ms": WS_COALESCE_WINDOW_MS, "max_messages": WS_COALESCE_MAX_MESSAGES}
+
+
+@pytest.mark.parametrize("options, expected", [
+    (None, None),
+    (False, None),
+    (True, DEFAULTS),
+    ({}, DEFAULTS),
+    ({"max_messages": 4}, {**DEFAULTS, "max_messages": 4}),
+    ({"window_ms": 10 ** 9, "max_messages": 0}, {"window_ms": WS_COALESCE_MAX_WINDOW_MS, "max_messages": 1}),
+    ({"window_ms": "soon"}, None),
+])
+def test_negotiation(options, expected):
+    assert negotiate_coalescing(options) == expected
+
+
+@pytest.mark.anyio
+async def test_flushes_when_max_messages_are_queued():
+    websocket = FakeWebSocket()
+    coalescer = FrameCoalescer(websocket, window_ms=60000, max_messages=3)
+    for number in range(2):
+        await coalescer.push(json.dumps({"n": number}))
+    assert websocket.sent == [] and coalescer.pending_bytes > 0
+    await coalescer.push(json.dumps({"n": 2}))
+    assert [json.loads(frame) for frame in websocket.sent] == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+    assert coalescer.pending_bytes == 0
+    coalescer.close()
+
+
+@pytest.mark.anyio
+async def test_flushes_when_the_window_ends():
+    websocket = FakeWebSocket()
+    coalescer = FrameCoalescer(websocket, window_ms=20, max_messages=100)
+    await coalescer.push(json.dumps({"n": 0}))
+    await coalescer.push(json.dumps({"n": 1}))
+    assert websocket.sent == []
+    await asyncio.sleep(0.1)
+    assert [json.loads(frame) for frame in websocket.sent] == [[{"n": 0}, {"n": 1}]]
+    assert coalescer.frames_sent == 1
+
+
+@pytest.mark.anyio
+async def test_settings_are_acknowledged(seeded, connect):
+    declined = await connect("user1", coalesce=False)
+    assert declined.sent == [{"type": "coalescing", "window_ms": None, "max_messages": None}]
+    defaults = await connect("user2", coalesce={})
+    assert defaults.sent == [{"type": "coalescing", **DEFAULTS}]
+    assert (await connect("user3")).sent == []
+
+
+@pytest.mark.anyio
+async def test_replies_do_not_overtake_buffered_frames(seeded, db, connect):
+    sender = await connect("user2", seeded.group_ids["main"], coalesce={"window_ms": 60000})
+    sender.sent.clear()
+    await handle_websocket_action(sender, {
+        "action": "send_group_message",
+        "data": {"group_id": "main", "message": {"sender_username": "user2", "content": "in order"}},
+        "request_id": 1
+    }, db)
+
+    batch, done = sender.sent
+    assert [message["content"] for message in json.loads(batch)] == ["in order"]
+    assert json.loads(done) == {"type": "done", "request_id": 1, "action": "send_group_message"}
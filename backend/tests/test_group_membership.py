@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from app.models import GroupMessage, group_user_association
+
+
+def member_ids(db, group_id: int) -> set:
+    members = group_user_association.c
+    return {user_id for (user_id,) in db.query(members.user_id).filter(members.group_id == group_id)}
+
+
+def message_count(db, group_id: int) -> int:
+    return db.query(GroupMessage).filter(GroupMessage.group_id == group_id).count()
+
+
+@pytest.mark.anyio
+async def test_bulk_add_is_announced_in_one_message(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    admin = await connect("user1", group_id)
+    listener = await connect("user2", group_id)
+    before = message_count(db, group_id)
+
+    # Duplicates and existing members are skipped, the order of the request is kept
+    frames = await action(admin, "add_users_to_group_chat", {"group_name": "main", "user_ids": [9, 8, 9, 3]})
+
+    assert frames[-1] == {"type": "members_added", "group_name": "main", "user_ids": [9, 8]}
+    assert member_ids(db, group_id) >= {8, 9}
+    assert message_count(db, group_id) == before + 1
+    # Broadcasts are serialized once for every subscriber
+    [announcement] = [json.loads(frame) for frame in listener.sent]
+    assert announcement["content"] == "I added user9 and user8"
+
+
+@pytest.mark.anyio
+async def test_bulk_remove_is_announced_in_one_message(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    admin = await connect("user1", group_id)
+    before = message_count(db, group_id)
+
+    frames = await action(admin, "remove_users_from_group_chat", {"group_name": "main", "user_ids": [2, 3, 4, 15]})
+
+    assert frames[-1] == {"type": "members_removed", "group_name": "main", "user_ids": [2, 3, 4]}
+    assert member_ids(db, group_id) == {5, 6}
+    assert message_count(db, group_id) == before + 1
+
+
+@pytest.mark.anyio
+async def test_the_acting_user_comes_from_the_socket(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    member = await connect("user2")
+    outsider = await connect("user15")
+
+    # Naming the admin in the payload does not make user2 the admin
+    assert await action(member, "remove_users_from_group_chat", {
+        "group_name": "main", "user_ids": [3, 4], "admin_name": "user1"
+    }) == [{"content": "You are not the admin, you cannot delete users."}]
+    assert await action(outsider, "add_users_to_group_chat", {
+        "group_name": "main", "user_ids": [16], "adder_name": "user1"
+    }) == [{"content": "User is not in the group. You can not add another user to this group"}]
+    assert member_ids(db, group_id) == {2, 3, 4, 5, 6}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("user_ids", [None, [], "7", 7, ["7"], [7, None], [True]])
+async def test_malformed_user_ids_are_rejected(seeded, db, connect, action, user_ids):
+    admin = await connect("user1")
+    for name in ("add_users_to_group_chat", "remove_users_from_group_chat"):
+        assert await action(admin, name, {"group_name": "main", "user_ids": user_ids}) == [
+            {"content": "user_ids must be a non-empty list of user ids"}
+        ]
+    assert admin.close_code is None
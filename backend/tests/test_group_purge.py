@@ -0,0 +1,59 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.models import (
+    ArchiveSegment, ConversationSummary, GroupChat, GroupMessage, ReadCursor, group_user_association
+)
+from app.utils.group_purge import purge_group
+from app.utils.message_archive import archive_batch
+from app.utils.message_search import search_messages
+
+
+def index_rows(db, group_id: int) -> int:
+    return db.execute(text(
+        "SELECT count(*) FROM message_search WHERE chat_type = 'group' AND chat_id = :chat_id"
+    ), {"chat_id": group_id}).scalar()
+
+
+def test_purge_removes_every_trace_of_the_group(seeded, db):
+    group_id = seeded.group_ids["main"]
+    archive_batch(db, "group", datetime.now(), batch_size=10)
+    paths = [path for (path,) in db.query(ArchiveSegment.path)]
+    db.add(ReadCursor(user_id=2, chat_type="group", chat_id=group_id, last_read_message_id=0, unread_count=3))
+    db.add(ConversationSummary(chat_type="group", chat_id=group_id, last_message_id=30))
+    db.query(GroupChat).filter(GroupChat.id == group_id).update({"is_deleted": True})
+    db.commit()
+    assert paths and index_rows(db, group_id) == 30
+
+    purge_group(group_id, chunk_size=7)
+
+    assert db.query(GroupChat).filter(GroupChat.id == group_id).count() == 0
+    assert db.query(GroupMessage).filter(GroupMessage.group_id == group_id).count() == 0
+    assert db.query(group_user_association).filter(group_user_association.c.group_id == group_id).count() == 0
+    assert db.query(ArchiveSegment).count() == 0
+    assert not any(os.path.exists(path) for path in paths)
+    assert db.query(ReadCursor).filter(ReadCursor.chat_type == "group").count() == 0
+    assert db.query(ConversationSummary).filter(ConversationSummary.chat_type == "group").count() == 0
+    assert index_rows(db, group_id) == 0
+    # The other group is untouched
+    assert db.query(GroupMessage).filter(GroupMessage.group_id == seeded.group_ids["other"]).count() == 5
+
+
+def test_purge_skips_groups_that_are_not_deleted(seeded, db):
+    purge_group(seeded.group_ids["main"])
+    assert db.query(GroupMessage).filter(GroupMessage.group_id == seeded.group_ids["main"]).count() == 30
+
+
+def test_reused_group_id_inherits_nothing(seeded, db):
+    group_id = seeded.group_ids["main"]
+    archive_batch(db, "group", datetime.now(), batch_size=10)
+    db.query(GroupChat).filter(GroupChat.id == group_id).update({"is_deleted": True})
+    db.commit()
+    purge_group(group_id)
+
+    # SQLite hands out the id again once the row is gone
+    db.add(GroupChat(id=group_id, name="reused", admin_id=7, is_deleted=False))
+    db.commit()
+    assert search_messages(db, 7, "main")["results"] == []
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from app.auth import create_access_token
+from app.websocket.handle_websocket_actions import connection_manager
+from app.websocket.heartbeat import HeartbeatReaper
+from benchmarks.harness import FakeWebSocket
+
+
+class StalledWebSocket(FakeWebSocket):
+    """A peer whose receive buffer is full: sends never complete."""
+
+    async def send_json(self, data, mode: str = "text"):
+        await asyncio.Event().wait()
+
+
+def age(websocket, seen: float = 0, active: float = 0):
+    """Pretend the socket was last heard from ``seen`` and last active ``active`` seconds ago."""
+    now = time.monotonic()
+    connection_manager.last_seen[websocket] = now - seen
+    connection_manager.last_active[websocket] = now - active
+
+
+async def settle():
+    # Reaped sockets are closed by background tasks
+    await asyncio.sleep(0.05)
+
+
+@pytest.mark.anyio
+async def test_live_sockets_are_pinged_and_silent_ones_reaped(seeded, connect):
+    reaper = HeartbeatReaper(connection_manager, ping_interval=1, ping_timeout=10, idle_timeout=0)
+    live = await connect("user2", seeded.group_ids["main"])
+    silent = await connect("user3", seeded.group_ids["main"])
+    age(silent, seen=11, active=11)
+    reaped = connection_manager.reaped_connections
+
+    await reaper.sweep()
+    await settle()
+
+    assert live.sent[-1] == {"type": "ping"} and live.close_code is None
+    assert silent.close_code == 1001 and {"type": "ping"} not in silent.sent
+    assert connection_manager.connected_websockets() == [live]
+    assert connection_manager.reaped_connections == reaped + 1
+
+
+@pytest.mark.anyio
+async def test_pongs_keep_a_socket_alive_but_not_active(seeded, connect):
+    reaper = HeartbeatReaper(connection_manager, ping_interval=1, ping_timeout=10, idle_timeout=60)
+    idle = await connect("user2")
+    age(idle, seen=61, active=61)
+    connection_manager.touch(idle, active=False)
+
+    await reaper.sweep()
+    await settle()
+
+    assert idle.close_code == 1001
+    assert idle not in connection_manager.connected_websockets()
+
+
+@pytest.mark.anyio
+async def test_a_stalled_ping_does_not_hold_up_the_sweep(seeded, connect):
+    reaper = HeartbeatReaper(connection_manager, ping_interval=0.05, ping_timeout=10, idle_timeout=0)
+    stalled = StalledWebSocket()
+    await connection_manager.connect(stalled, "csrf", create_access_token({"sub": "user3"}))
+    live = await connect("user2")
+
+    await asyncio.wait_for(reaper.sweep(), timeout=1)
+    await settle()
+
+    assert stalled.close_code == 1001
+    assert live.sent[-1] == {"type": "ping"}
+    assert stalled not in connection_manager.connected_websockets()
+
+
+@pytest.mark.anyio
+async def test_reaped_sockets_leave_their_rooms(seeded, connect):
+    group_id = seeded.group_ids["main"]
+    websocket = await connect("user2", group_id)
+    assert connection_manager.stats()["room_subscriptions"] == 1
+
+    connection_manager.reap_later(websocket, "Heartbeat timeout")
+    await settle()
+
+    assert connection_manager.stats()["room_subscriptions"] == 0
+    assert connection_manager.get_user_info(websocket) is None
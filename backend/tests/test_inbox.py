@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import ReadCursor
+from app.utils.inbox import get_inbox
+
+
+def send_group_message(action, websocket, sender: str, content: str):
+    return action(websocket, "send_group_message", {
+        "group_id": "main", "message": {"sender_username": sender, "content": content}
+    })
+
+
+def chats(db, user_id: int) -> list:
+    return [(conversation["chat_type"], conversation["chat_id"])
+            for conversation in get_inbox(db, user_id, limit=100)["conversations"]]
+
+
+@pytest.mark.anyio
+async def test_new_message_shows_in_members_inboxes(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    sender = await connect("user2", group_id)
+    await send_group_message(action, sender, "user2", "hello inbox")
+
+    [conversation] = get_inbox(db, 3)["conversations"]
+    assert conversation["chat_id"] == group_id
+    assert conversation["group_name"] == "main"
+    assert conversation["unread_count"] == 1
+    assert conversation["last_message"]["preview"] == "hello inbox"
+    assert conversation["last_message"]["sender_username"] == "user2"
+    # The sender's own cursor is moved past the message
+    assert get_inbox(db, 2)["conversations"][0]["unread_count"] == 0
+    assert chats(db, 15) == []
+
+
+@pytest.mark.anyio
+async def test_inbox_pages_most_recent_first(seeded, db, connect, action):
+    admin = await connect("user1", seeded.group_ids["main"])
+    await send_group_message(action, admin, "user1", "older")
+    await action(admin, "send_private_message", {
+        "chat_id": seeded.private_chat_id, "message": {"sender_username": "user1", "content": "newer"}
+    })
+
+    first = get_inbox(db, 2, limit=1)
+    second = get_inbox(db, 2, limit=1, cursor=first["next_cursor"])
+    assert [conversation["last_message"]["preview"] for conversation in first["conversations"]] == ["newer"]
+    assert [conversation["last_message"]["preview"] for conversation in second["conversations"]] == ["older"]
+    assert get_inbox(db, 2, limit=1, cursor=second["next_cursor"])["conversations"] == []
+
+
+@pytest.mark.anyio
+async def test_removed_members_stop_seeing_the_group(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    admin = await connect("user1", group_id)
+    await send_group_message(action, admin, "user1", "before")
+    assert ("group", group_id) in chats(db, 3)
+
+    await action(admin, "remove_users_from_group_chat", {
+        "group_name": "main", "user_ids": [3]
+    })
+    await send_group_message(action, admin, "user1", "after")
+    assert ("group", group_id) not in chats(db, 3)
+    assert db.query(ReadCursor).filter(ReadCursor.user_id == 3, ReadCursor.chat_type == "group").count() == 0
+
+    # A cursor left behind does not list the group either
+    db.add(ReadCursor(user_id=3, chat_type="group", chat_id=group_id, last_read_message_id=0,
+                      unread_count=1, last_message_at=datetime.now()))
+    db.commit()
+    assert ("group", group_id) not in chats(db, 3)
+
+
+def test_malformed_cursor_is_rejected(seeded, db):
+    with pytest.raises(ValueError):
+        get_inbox(db, 2, cursor="nope")
@@ -0,0 +1,70 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from app.models import ArchiveSegment, GroupChat, GroupMessage
+from app.utils.message_archive import apply_retention, archive_batch, get_history
+from tests.conftest import MAIN_MESSAGES
+
+
+def test_retention_moves_old_messages_to_segments(seeded, db):
+    # Seeded messages are a day old
+    assert apply_retention(retention_days=0.5, batch_size=7) == MAIN_MESSAGES + 5 + 10
+    assert db.query(GroupMessage).count() == 0
+    segments = db.query(ArchiveSegment).all()
+    assert segments and all(os.path.exists(segment.path) for segment in segments)
+    assert apply_retention(retention_days=0.5) == 0
+
+
+def test_each_segment_holds_one_chat_filled_up_to_the_batch(seeded, db):
+    apply_retention(retention_days=0.5, batch_size=7)
+    counts = {}
+    for segment in db.query(ArchiveSegment).order_by(ArchiveSegment.id):
+        counts.setdefault((segment.chat_type, segment.chat_id), []).append(segment.message_count)
+    assert counts == {
+        ("group", seeded.group_ids["main"]): [7, 7, 7, 7, 2],
+        ("group", seeded.group_ids["other"]): [5],
+        ("private", seeded.private_chat_id): [7, 3],
+    }
+
+
+def test_deleted_groups_are_left_to_the_purge(seeded, db):
+    main = seeded.group_ids["main"]
+    db.query(GroupChat).filter(GroupChat.id == main).update({"is_deleted": True})
+    db.commit()
+    assert archive_batch(db, "group", datetime.now(), batch_size=100) == 5
+    assert archive_batch(db, "group", datetime.now(), batch_size=100) == 0
+    assert db.query(GroupMessage).filter(GroupMessage.group_id == main).count() == MAIN_MESSAGES
+    assert db.query(ArchiveSegment).filter(ArchiveSegment.chat_id == main).count() == 0
+
+
+def test_history_continues_from_the_hot_table_into_the_archive(seeded, db):
+    group_id = seeded.group_ids["main"]
+    # One batch archives ids 1-10, the oldest rows, which all belong to "main"
+    assert archive_batch(db, "group", datetime.now(), batch_size=10) == 10
+
+    newest = get_history(db, "group", group_id, limit=10)
+    assert [message["id"] for message in newest] == list(range(21, 31))
+
+    across = get_history(db, "group", group_id, before_id=15, limit=10)
+    assert [message["id"] for message in across] == list(range(5, 15))
+    assert across[0]["content"] == "message 5 in main"
+    assert "sender_id" not in across[0]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("limit, expected", [(0, 1), (-5, 1), (3, 3), (1000, MAIN_MESSAGES)])
+async def test_history_limit_is_clamped(seeded, connect, action, limit, expected):
+    member = await connect("user2")
+    [frame] = await action(member, "get_history", {"group_name": "main", "limit": limit})
+    assert frame["type"] == "history"
+    assert len(frame["history"]) == expected
+
+
+@pytest.mark.anyio
+async def test_history_is_for_members_only(seeded, connect, action):
+    outsider = await connect("user15")
+    assert await action(outsider, "get_history", {"group_name": "main"}) == [
+        {"content": "User is not in the group."}
+    ]
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.message_archive import archive_batch
+from app.utils.message_search import search_messages
+
+
+def all_pages(db, user_id: int, query: str, limit: int, rank_window: int) -> list:
+    results, cursor = [], None
+    while True:
+        page = search_messages(db, user_id, query, limit, cursor, rank_window=rank_window)
+        results += page["results"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return results
+
+
+def test_members_find_messages_of_their_chats_only(seeded, db):
+    # user5 is in "main" only, user2 also in "other" and the private chat
+    results = search_messages(db, 5, "message", limit=100)["results"]
+    assert {(result["chat_type"], result["chat_id"]) for result in results} == {("group", seeded.group_ids["main"])}
+    results = search_messages(db, 2, "message", limit=100)["results"]
+    assert {(result["chat_type"], result["chat_id"]) for result in results} == {
+        ("group", seeded.group_ids["main"]), ("group", seeded.group_ids["other"]), ("private", seeded.private_chat_id)
+    }
+
+
+def test_outsiders_find_nothing(seeded, db):
+    assert search_messages(db, 15, "message")["results"] == []
+
+
+def test_every_match_is_reachable_once_across_pages(seeded, db):
+    results = all_pages(db, 1, "message", limit=4, rank_window=7)
+    ids = [(result["chat_type"], result["id"]) for result in results]
+    assert len(ids) == len(set(ids)) == 30 + 5 + 10
+
+
+def test_archived_messages_stay_searchable(seeded, db):
+    archive_batch(db, "group", datetime.now(), batch_size=10)
+    results = search_messages(db, 2, "7 main")["results"]
+    assert [result["id"] for result in results] == [7]
+
+
+def test_malformed_cursor_is_rejected(seeded, db):
+    with pytest.raises(ValueError):
+        search_messages(db, 2, "message", cursor="not a cursor")
+
+
+@pytest.mark.anyio
+async def test_search_action_reports_a_bad_cursor(seeded, connect, action):
+    member = await connect("user2")
+    assert await action(member, "search_messages", {"query": "message", "cursor": "x"}) == [
+        {"content": "Invalid cursor"}
+    ]
@@ -0,0 +1,64 @@
+import pytest
+
+from app.websocket.handle_websocket_actions import connection_manager, presence_manager
+
+
+@pytest.fixture(autouse=True)
+def no_pending_presence():
+    presence_manager.pending.clear()
+    yield
+    presence_manager.pending.clear()
+
+
+def presence_frames(websocket) -> list:
+    return [frame for frame in websocket.decoded() if frame.get("type") == "presence"]
+
+
+@pytest.mark.anyio
+async def test_changes_are_sent_once_per_tick(seeded, connect):
+    group_id = seeded.group_ids["main"]
+    listener = await connect("user2", group_id)
+    await connect("user3", group_id)
+    await connect("user4", group_id)
+
+    await presence_manager.flush()
+
+    assert presence_frames(listener) == [{
+        "type": "presence", "chat_type": "group", "chat_id": group_id,
+        "joined": ["user2", "user3", "user4"], "left": []
+    }]
+    assert presence_manager.get_online(group_id, "group") == ["user2", "user3", "user4"]
+
+
+@pytest.mark.anyio
+async def test_leaving_and_coming_back_within_a_tick_cancels_out(seeded, connect):
+    group_id = seeded.group_ids["main"]
+    listener = await connect("user2", group_id)
+    flapping = await connect("user3", group_id)
+    await presence_manager.flush()
+    listener.sent.clear()
+
+    connection_manager.disconnect(flapping)
+    await connect("user3", group_id)
+    await presence_manager.flush()
+
+    assert presence_frames(listener) == []
+    assert presence_manager.get_online(group_id, "group") == ["user2", "user3"]
+
+
+@pytest.mark.anyio
+async def test_a_user_is_online_until_their_last_socket_leaves(seeded, connect):
+    group_id = seeded.group_ids["main"]
+    listener = await connect("user2", group_id)
+    first, second = await connect("user3", group_id), await connect("user3", group_id)
+    await presence_manager.flush()
+    listener.sent.clear()
+
+    connection_manager.disconnect(first)
+    await presence_manager.flush()
+    assert presence_frames(listener) == []
+
+    connection_manager.disconnect(second)
+    await presence_manager.flush()
+    assert [(frame["joined"], frame["left"]) for frame in presence_frames(listener)] == [([], ["user3"])]
+    assert presence_manager.get_online(group_id, "group") == ["user2"]
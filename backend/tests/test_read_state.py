@@ -0,0 +1,63 @@
+import pytest
+
+from app.utils.read_state import get_unread_counts, mark_read
+from tests.conftest import MAIN_MESSAGES
+
+
+def unread(db, user_id: int, chat_type: str = "group") -> dict:
+    return {chat["chat_id"]: chat["unread_count"] for chat in get_unread_counts(db, user_id)
+            if chat["chat_type"] == chat_type}
+
+
+@pytest.mark.anyio
+async def test_messages_count_as_unread_for_everyone_but_the_sender(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    sender = await connect("user2", group_id)
+    for content in ("one", "two"):
+        await action(sender, "send_group_message", {
+            "group_id": "main", "message": {"sender_username": "user2", "content": content}
+        })
+
+    assert unread(db, 3) == unread(db, 1) == {group_id: 2}
+    assert unread(db, 2) == {group_id: 0}
+    assert unread(db, 15) == {}
+
+
+def test_mark_read_counts_what_is_after_the_cursor(seeded, db):
+    group_id = seeded.group_ids["main"]
+    cursor = mark_read(db, 3, "group", group_id, 20)
+    assert (cursor.last_read_message_id, cursor.unread_count) == (20, MAIN_MESSAGES - 20)
+
+    # The cursor never moves back
+    cursor = mark_read(db, 3, "group", group_id, 5)
+    assert (cursor.last_read_message_id, cursor.unread_count) == (20, MAIN_MESSAGES - 20)
+
+    # Past the newest message, or no id at all, means everything was read
+    assert mark_read(db, 3, "group", group_id, 10 ** 6).last_read_message_id == MAIN_MESSAGES
+    assert mark_read(db, 4, "group", group_id).unread_count == 0
+    assert unread(db, 3) == {group_id: 0}
+
+
+@pytest.mark.anyio
+async def test_mark_read_replies_and_sends_a_receipt_to_the_chat(seeded, db, connect, action):
+    group_id = seeded.group_ids["main"]
+    reader = await connect("user3")
+    listener = await connect("user2", group_id)
+
+    assert await action(reader, "mark_read", {"group_name": "main", "message_id": 25}) == [{
+        "type": "unread", "chat_type": "group", "chat_id": group_id,
+        "last_read_message_id": 25, "unread_count": MAIN_MESSAGES - 25
+    }]
+    assert listener.decoded() == [{
+        "type": "read_receipt", "chat_type": "group", "chat_id": group_id, "username": "user3", "message_id": 25
+    }]
+    [counts] = await action(reader, "get_unread_counts")
+    assert counts["type"] == "unread_counts"
+    assert [(chat["group_name"], chat["unread_count"]) for chat in counts["chats"]] == [("main", MAIN_MESSAGES - 25)]
+
+
+@pytest.mark.anyio
+async def test_outsiders_cannot_mark_a_chat_read(seeded, db, connect, action):
+    outsider = await connect("user15")
+    assert await action(outsider, "mark_read", {"group_name": "main"}) == [{"content": "User is not in the group."}]
+    assert unread(db, 15) == {}
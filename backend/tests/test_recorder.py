@@ -0,0 +1,68 @@
+import base64
+import gzip
+
+from app.websocket.recorder import TrafficRecorder, read_traffic, scrub
+from benchmarks.harness import FakeWebSocket
+
+CONNECT_FRAME = {"access_token": "secret-access", "csrf_token": "secret-csrf", "action": "join_group_chat",
+                 "data": {"group_name": "main"}}
+
+
+def test_credentials_are_scrubbed_at_any_depth():
+    frame = {
+        "action": "register",
+        "data": {"username": "user1", "password": "hunter2", "nested": [{"refresh_token": "r", "keep": 1}]},
+        "hashed_password": "x",
+    }
+    assert scrub(frame) == {"action": "register", "data": {"username": "user1", "nested": [{"keep": 1}]}}
+    # The frame handed to the handlers is left alone
+    assert frame["data"]["password"] == "hunter2"
+
+
+def test_recorded_log_holds_no_credentials(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    recorder = TrafficRecorder(path)
+    websocket = FakeWebSocket()
+    recorder.open(websocket, "user2", CONNECT_FRAME)
+    recorder.record(websocket, {"action": "send_group_message", "access_token": "secret-access", "data": {}})
+    recorder.record_bytes(websocket, b"\x00chunk")
+    recorder.close(websocket)
+    recorder.shutdown()
+
+    with gzip.open(path, "rt", encoding="utf-8") as log:
+        assert "secret" not in log.read()
+    records = list(read_traffic(path))
+    assert [(connection_id, kind) for _, connection_id, kind, _ in records] == [
+        (1, "open"), (1, "text"), (1, "binary"), (1, "close")
+    ]
+    assert records[0][3] == {"username": "user2",
+                             "frame": {"action": "join_group_chat", "data": {"group_name": "main"}}}
+    assert records[1][3] == {"action": "send_group_message", "data": {}}
+    assert base64.b64decode(records[2][3]) == b"\x00chunk"
+
+
+def test_disabled_recorder_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    recorder = TrafficRecorder("")
+    websocket = FakeWebSocket()
+    recorder.open(websocket, "user2", CONNECT_FRAME)
+    recorder.record(websocket, {"action": "get_inbox"})
+    recorder.close(websocket)
+    recorder.shutdown()
+    assert recorder.connection_ids == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_truncated_log_reads_up_to_the_damage(tmp_path):
+    path = str(tmp_path / "traffic.jsonl.gz")
+    recorder = TrafficRecorder(path)
+    websocket = FakeWebSocket()
+    recorder.open(websocket, "user2", CONNECT_FRAME)
+    recorder.close(websocket)
+    recorder.shutdown()
+    with open(path, "rb") as log:
+        data = log.read()
+    with open(path, "wb") as log:
+        log.write(data + gzip.compress(b'[1.0,2,"text",{"act')[:-10])
+
+    assert [kind for _, _, kind, _ in read_traffic(path)] == ["open", "close"]
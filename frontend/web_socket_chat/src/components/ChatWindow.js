@@ -42,6 +42,16 @@ function ChatWindow({ currentUser, chatUser }) {
             try {
                 const message = JSON.parse(event.data); // Safely parse JSON
 
+                // Answer the server heartbeat, otherwise the connection is reaped as dead
+                if (message.type === "ping") {
+                    websocket.send(JSON.stringify({ action: "pong" }));
+                    return;
+                }
+                // Frames with a type (presence, read receipts, ...) are not chat messages
+                if (message.type) {
+                    return;
+                }
+
                 // Access values in the parsed object
                 if (message.chat_id) {
                     setChatId(message.chat_id); // Assuming this is a React state setter
@@ -103,6 +103,15 @@ function GroupChatWindow({ currentUser, group }) {
         websocket.onmessage = (event) => {
             try {
                 const message = JSON.parse(event.data);
+                // Answer the server heartbeat, otherwise the connection is reaped as dead
+                if (message.type === "ping") {
+                    websocket.send(JSON.stringify({ action: "pong" }));
+                    return;
+                }
+                // Frames with a type (presence, read receipts, ...) are not chat messages
+                if (message.type) {
+                    return;
+                }
                 if (message.history) {
                     setMessages(message.history);
                 } else {